@@ -12,290 +12,117 @@
     requests version: 2.27.0
 '''
 
-import get_token
+import apic_client
+import apic_query
 import snapshot
 import logging
 from logging.handlers import RotatingFileHandler
 import sys
-import time
-import requests
 import json
 import datetime
 import re
 
 
 #Logs into fabric and saves token, url and change number
-login = get_token.get_token()
+login = apic_client.login()
 token = login[0]
 fabric = login[1]
 change = login[2]
-timer = time.time()
 
+#number of BDs (with their subnets) pulled per page
+BD_PAGE_SIZE = 500
 
-def get_bds():
-    global token, timer
-    
-    c_timer = time.time()
-    d_timer = c_timer - timer
-    if d_timer >= 540:
-        token = get_token.refresh_token(fabric, token)
-        timer = time.time()
-    if d_timer >= 600:
-        token = get_token.get_token()
-        timer = time.time()
 
-    url = fabric + "/api/class/fvBD.json"
+'''
+This function pages through every fvBD with its fvSubnet children in one class query and yields the BDs one at a time.
+The next page is fetched while the current one is processed, set BD_PAGE_SIZE lower on very large fabrics.
+'''
+def get_bds(page_size=BD_PAGE_SIZE):
+    #only the config properties are returned, target_state() only looks at unicastRoute, unkMacUcastAct, arpFlood and the subnet ips
+    url = apic_query.class_url(fabric, "fvBD", subtree="children", subtree_class="fvSubnet", props="config-only")
+
+    for bd in apic_client.iter_objects(url, page_size, label="Bridge domains"):
+
+        #If not status code 200, stop
+        if bd == None:
+            print("Error! Could not retreive list of bridge domains.")
+            sys.exit()
 
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
+        yield bd
+
+
+'''
+This function works out the target state of a legacy BD. Returns the fvBD attributes to change and the subnets to delete.
+BDs with subnets and unicast routing enabled are left alone.
+'''
+def target_state(bd):
+    attributes = bd["fvBD"]["attributes"]
 
-    requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
+    changes = {}
+    subnets = []
 
-    #If not status code 200, skip request
-    if response.status_code != 200:
-        print("Error! Could not retreive list of bridge domains.")
-        print(response)
-        sys.exit()
+    if "children" in bd["fvBD"]:
+        if attributes["unicastRoute"] == "yes":
+            return(changes, subnets)
+        for item in bd["fvBD"]["children"]:
+            subnets.append(item["fvSubnet"]["attributes"]["ip"])
+    elif attributes["unicastRoute"] == "yes":
+        changes["unicastRoute"] = "false"
 
-    response_json = json.loads(response.text)
+    if attributes["unkMacUcastAct"] == "proxy":
+        changes["unkMacUcastAct"] = "flood"
+        changes["arpFlood"] = "true"
 
-    return(response_json["imdata"])
+    if attributes["arpFlood"] == "no":
+        changes["arpFlood"] = "true"
+
+    return(changes, subnets)
 
 
 def main():
-    global token, timer
     snapshot.snapshot_pre(change, token, fabric)
 
-    bdlist = get_bds()
+    for bd in get_bds():
+
+        bd_dn = bd["fvBD"]["attributes"]["dn"]
 
-    for item in bdlist:
+        changes, subnets = target_state(bd)
+
+        if changes == {} and subnets == []:
+            continue
 
-        bd_dn = item["fvBD"]["attributes"]["dn"]
+        #sends the attribute changes and subnet deletions for the BD in one request
+        url = fabric + "/api/node/mo/" + bd_dn + ".json"
 
-        c_timer = time.time()
-        d_timer = c_timer - timer
-        if d_timer >= 540:
-            token = get_token.refresh_token(fabric, token)
-            timer = time.time()
-        if d_timer >= 600:
-            token = get_token.get_token()
-            timer = time.time()
+        attributes = {"dn": bd_dn}
+        attributes.update(changes)
 
-        url = fabric + "/api/mo/" + bd_dn + ".json?rsp-subtree=full&rsp-subtree-class=fvSubnet"
+        children = []
+        for subnet in subnets:
+            children.append({"fvSubnet":{"attributes":{"dn":bd_dn + "/subnet-[" + subnet + "]","status":"deleted"},"children":[]}})
 
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
+        payload = {"fvBD":{"attributes":attributes,"children":children}}
+        data = json.dumps(payload)
 
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
+        response = apic_client.post(url, data=data)
 
         #If not status code 200, skip request
         if response.status_code != 200:
-            print("Error! Could not retreive subnets from bridge domain.")
+            print("Error! Could not update " + bd_dn + ".")
             print(response)
+            print("\n")
             continue
 
-        response_json = json.loads(response.text)
-
-        if "children" in response_json["imdata"][0]["fvBD"]:
-            if response_json["imdata"][0]["fvBD"]["attributes"]["unicastRoute"] == "yes":
-                continue
-            else:
-                for item in response_json["imdata"][0]["fvBD"]["children"]:
-                    subnet = item["fvSubnet"]["attributes"]["ip"]
-
-                    c_timer = time.time()
-                    d_timer = c_timer - timer
-                    if d_timer >= 540:
-                        token = get_token.refresh_token(fabric, token)
-                        timer = time.time()
-                    if d_timer >= 600:
-                        token = get_token.get_token()
-                        timer = time.time()
-
-                    url = fabric + "/api/node/mo/" + bd_dn + "/subnet-[" + subnet + "].json"
-
-                    headers = {
-                        "Cookie" : f"APIC-Cookie={token}", 
-                    }
-
-                    payload = {"fvSubnet":{"attributes":{"dn":bd_dn + "/subnet-[" + subnet + "]","status":"deleted"},"children":[]}}
-                    data = json.dumps(payload)
-
-                    requests.packages.urllib3.disable_warnings()
-                    response = requests.post(url, data=data, headers=headers, verify=False)
-
-                    #If not status code 200, skip request
-                    if response.status_code != 200:
-                        print("Error! Could not remove subnet for " + bd_dn + ".")
-                        print(response)
-                        continue
-                    else:
-                        print("Subnet " + subnet + " removed from " + bd_dn)
-
-
-                if response_json["imdata"][0]["fvBD"]["attributes"]["unkMacUcastAct"] == "proxy":
-                    c_timer = time.time()
-                    d_timer = c_timer - timer
-                    if d_timer >= 540:
-                        token = get_token.refresh_token(fabric, token)
-                        timer = time.time()
-                    if d_timer >= 600:
-                        token = get_token.get_token()
-                        timer = time.time()
-
-                    url = fabric + "/api/node/mo/" + bd_dn + ".json"
-
-                    headers = {
-                        "Cookie" : f"APIC-Cookie={token}", 
-                    }
-
-                    payload = {"fvBD":{"attributes":{"dn":bd_dn,"unkMacUcastAct":"flood","arpFlood":"true"},"children":[]}}
-                    data = json.dumps(payload)
-
-                    requests.packages.urllib3.disable_warnings()
-                    response = requests.post(url, data=data, headers=headers, verify=False)
-
-                    #If not status code 200, skip request
-                    if response.status_code != 200:
-                        print("Error! Could not update l2 unknown unicast for " + bd_dn + ".")
-                        print(response)
-                        continue
-                    else:
-                        print("L2 Unknown cast set to flood for " + bd_dn)
-
-                if response_json["imdata"][0]["fvBD"]["attributes"]["arpFlood"] == "no":
-            
-                    c_timer = time.time()
-                    d_timer = c_timer - timer
-                    if d_timer >= 540:
-                        token = get_token.refresh_token(fabric, token)
-                        timer = time.time()
-                    if d_timer >= 600:
-                        token = get_token.get_token()
-                        timer = time.time()
-
-                    url = fabric + "/api/node/mo/" + bd_dn + ".json"
-
-                    headers = {
-                        "Cookie" : f"APIC-Cookie={token}", 
-                    }
-
-                    payload = {"fvBD":{"attributes":{"dn":bd_dn,"arpFlood":"true"},"children":[]}}
-                    data = json.dumps(payload)
-
-                    requests.packages.urllib3.disable_warnings()
-                    response = requests.post(url, data=data, headers=headers, verify=False)
-
-                    #If not status code 200, skip request
-                    if response.status_code != 200:
-                        print("Error! Could not update unicast routing for " + bd_dn + ".")
-                        print(response)
-                        continue
-                    else:
-                        print("ARP flooding enabled for " + bd_dn)  
-
-                print("\n")
-                continue
-
-        if response_json["imdata"][0]["fvBD"]["attributes"]["unkMacUcastAct"] == "proxy":
-            
-            c_timer = time.time()
-            d_timer = c_timer - timer
-            if d_timer >= 540:
-                token = get_token.refresh_token(fabric, token)
-                timer = time.time()
-            if d_timer >= 600:
-                token = get_token.get_token()
-                timer = time.time()
-
-            url = fabric + "/api/node/mo/" + bd_dn + ".json"
-
-            headers = {
-                "Cookie" : f"APIC-Cookie={token}", 
-            }
-
-            payload = {"fvBD":{"attributes":{"dn":bd_dn,"unkMacUcastAct":"flood","arpFlood":"true"},"children":[]}}
-            data = json.dumps(payload)
-
-            requests.packages.urllib3.disable_warnings()
-            response = requests.post(url, data=data, headers=headers, verify=False)
-
-            #If not status code 200, skip request
-            if response.status_code != 200:
-                print("Error! Could not update l2 unknown unicast for " + bd_dn + ".")
-                print(response)
-                continue
-            else:
-                print("L2 Unknown cast set to flood for " + bd_dn)
-
-        if response_json["imdata"][0]["fvBD"]["attributes"]["unicastRoute"] == "yes":
-
-            c_timer = time.time()
-            d_timer = c_timer - timer
-            if d_timer >= 540:
-                token = get_token.refresh_token(fabric, token)
-                timer = time.time()
-            if d_timer >= 600:
-                token = get_token.get_token()
-                timer = time.time()
-
-            url = fabric + "/api/node/mo/" + bd_dn + ".json"
-
-            headers = {
-                "Cookie" : f"APIC-Cookie={token}", 
-            }
-
-            payload = {"fvBD":{"attributes":{"dn":bd_dn,"unicastRoute":"false"},"children":[]}}
-            data = json.dumps(payload)
-
-            requests.packages.urllib3.disable_warnings()
-            response = requests.post(url, data=data, headers=headers, verify=False)
-
-            #If not status code 200, skip request
-            if response.status_code != 200:
-                print("Error! Could not update unicast routing for " + bd_dn + ".")
-                print(response)
-                continue
-            else:
-                print("Unicast routing disabled for " + bd_dn)
-
-        if response_json["imdata"][0]["fvBD"]["attributes"]["arpFlood"] == "no":
-            c_timer = time.time()
-            d_timer = c_timer - timer
-            if d_timer >= 540:
-                token = get_token.refresh_token(fabric, token)
-                timer = time.time()
-            if d_timer >= 600:
-                token = get_token.get_token()
-                timer = time.time()
-
-            url = fabric + "/api/node/mo/" + bd_dn + ".json"
-
-            headers = {
-                "Cookie" : f"APIC-Cookie={token}", 
-            }
-
-            payload = {"fvBD":{"attributes":{"dn":bd_dn,"arpFlood":"true"},"children":[]}}
-            data = json.dumps(payload)
-
-            requests.packages.urllib3.disable_warnings()
-            response = requests.post(url, data=data, headers=headers, verify=False)
-
-            #If not status code 200, skip request
-            if response.status_code != 200:
-                print("Error! Could not update unicast routing for " + bd_dn + ".")
-                print(response)
-                continue
-            else:
-                print("ARP flooding enabled for " + bd_dn)
-
-
-        if response_json["imdata"][0]["fvBD"]["attributes"]["unkMacUcastAct"] == "proxy" or response_json["imdata"][0]["fvBD"]["attributes"]["unicastRoute"] == "yes" or response_json["imdata"][0]["fvBD"]["attributes"]["arpFlood"] == "no":
-            print("\n")
+        for subnet in subnets:
+            print("Subnet " + subnet + " removed from " + bd_dn)
+        if "unkMacUcastAct" in changes:
+            print("L2 Unknown cast set to flood for " + bd_dn)
+        if "unicastRoute" in changes:
+            print("Unicast routing disabled for " + bd_dn)
+        if "arpFlood" in changes:
+            print("ARP flooding enabled for " + bd_dn)
+
+        print("\n")
 
     snapshot.snapshot_post(change, token, fabric)
 
@@ -0,0 +1,455 @@
+#!/usr/bin/env python
+
+'''
+   Shared APIC client used by all of the scripts. It logs in through get_token.py and keeps one pooled
+   requests session open so every call reuses the same keep-alive TCP/TLS connection and auth cookie.
+
+
+    File name: apic_client.py
+    Author: Nicholas Bogdajewicz
+    Date created: 10/18/2026
+    Date last modified: 10/18/2026
+    Python Version: 3.8.2
+    requests version: 2.27.0
+'''
+
+import get_token
+import mo_cache
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import threading
+import json
+import time
+import re
+
+#optional faster json backends. orjson is used to parse normal sized responses, ijson to stream paginated
+#class queries straight off the socket. json from the standard library is used if they are not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+#default pool sizes. pool_connections is the number of hosts kept in the pool, pool_maxsize is the number of open connections per host
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+#APIC tokens expire after 600 seconds. The background thread refreshes ahead of that and retries sooner if a refresh fails
+REFRESH_INTERVAL = 540
+REFRESH_RETRY = 15
+
+#number of objects per page for paginated class queries
+PAGE_SIZE = 1000
+
+#max size in bytes of one bulk POST payload
+MAX_PAYLOAD = 500000
+
+#parse pages of class queries incrementally with ijson (if installed) instead of loading the whole response text first
+STREAM_JSON = True
+
+#max requests per second sent to the fabric across all threads. 0 means no limit. Change with set_rate_limit()
+RATE_LIMIT = 0
+
+#memoizes MO GETs for the length of the run. Entries under a DN that is posted to are dropped (see post())
+GET_CACHE = True
+GET_CACHE_SIZE = 2048
+
+session = None
+token = None
+fabric = None
+change = None
+
+token_lock = threading.Lock()
+refresh_stop = threading.Event()
+refresh_thread = None
+
+rate_lock = threading.Lock()
+next_slot = 0.0
+
+#{normalized url: response} with the most recently used url last
+get_cache = collections.OrderedDict()
+get_cache_lock = threading.Lock()
+
+
+'''
+This function builds a requests session with a connection pool mounted for https. Open connections are kept alive
+between calls so the TLS session is only negotiated once per pooled connection instead of once per request.
+'''
+def new_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+
+    requests.packages.urllib3.disable_warnings()
+
+    new = requests.Session()
+    new.verify = False
+    new.headers.update({"Connection": "keep-alive"})
+
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    new.mount("https://", adapter)
+    new.mount("http://", adapter)
+
+    return(new)
+
+
+'''
+This function logs into the fabric with the shared session and stores the token as the session cookie.
+Returns the same (token, fabric, change) tuple as get_token.get_token() and starts the background token refresh
+'''
+def login(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, refresh_interval=REFRESH_INTERVAL):
+    global session, fabric, change
+
+    session = new_session(pool_connections, pool_maxsize)
+
+    login = get_token.get_token(session)
+    fabric = login[1]
+    change = login[2]
+    set_token(login[0])
+
+    start_refresh(refresh_interval)
+
+    return(login)
+
+
+'''
+This function returns a short name for the logged in fabric (ex. qic-fabric) for per fabric log and state files,
+so runs against different fabrics at the same time (multi_fabric.py) don't write to the same file
+'''
+def fabric_name():
+    return(re.findall(r'^https?://([^./:]+)', fabric)[0])
+
+
+'''
+This function replaces the APIC-Cookie on the shared session
+'''
+def set_token(new_token):
+    global token
+
+    with token_lock:
+        token = new_token
+        session.cookies.set("APIC-Cookie", token)
+
+
+'''
+This function refreshes the token over the shared session and updates the cookie
+'''
+def refresh_token():
+
+    with token_lock:
+        current = token
+
+    set_token(get_token.refresh_token(fabric, current, session))
+
+    return(token)
+
+
+'''
+This function runs in the background thread and calls aaaRefresh every interval until stop_refresh() is called.
+It never prompts for credentials, a failed refresh is retried every REFRESH_RETRY seconds instead.
+'''
+def refresh_loop(interval):
+
+    wait = interval
+    while not refresh_stop.wait(wait):
+        try:
+            refresh_token()
+            wait = interval
+        except (requests.exceptions.RequestException, KeyError, IndexError, ValueError) as error:
+            print("ERROR! Could not refresh the APIC token, retrying in " + str(REFRESH_RETRY) + " seconds. " + str(error))
+            wait = REFRESH_RETRY
+
+
+'''
+This function starts the token refresh thread. It is a daemon thread so it exits with the script.
+'''
+def start_refresh(interval=REFRESH_INTERVAL):
+    global refresh_thread
+
+    if refresh_thread != None and refresh_thread.is_alive():
+        return
+
+    refresh_stop.clear()
+    refresh_thread = threading.Thread(target=refresh_loop, args=(interval,), name="apic-token-refresh", daemon=True)
+    refresh_thread.start()
+
+
+def stop_refresh():
+
+    refresh_stop.set()
+    if refresh_thread != None:
+        refresh_thread.join()
+
+
+def set_rate_limit(limit):
+    global RATE_LIMIT
+
+    RATE_LIMIT = limit
+
+
+'''
+This function spaces requests out to RATE_LIMIT per second. Each caller reserves the next free slot under the lock
+and then sleeps outside of it, so threads are released in order without holding each other up.
+'''
+def throttle():
+    global next_slot
+
+    if RATE_LIMIT <= 0:
+        return
+
+    with rate_lock:
+        now = time.monotonic()
+        slot = max(now, next_slot)
+        next_slot = slot + 1.0 / RATE_LIMIT
+
+    if slot > now:
+        time.sleep(slot - now)
+
+
+'''
+This function returns the MO dn and a normalized cache key for an MO query url (query options sorted, host lower case).
+Returns (None, None) for anything else. Class queries are not kept in memory and get_page() skips the cache for paged MO queries.
+'''
+def cache_key(url):
+
+    found = re.findall(r'^(https?://[^/]+)/api/(?:node/)?mo/(.+?)\.json(?:\?(.*))?$', url)
+    if found == []:
+        return(None, None)
+
+    host, dn, query = found[0]
+    params = sorted(param for param in query.split("&") if param != "")
+
+    return(dn, host.lower() + "/api/node/mo/" + dn + ".json?" + "&".join(params))
+
+
+'''
+This function sends a GET. MO queries are answered from the in-run cache unless cache is False, which is used for
+reads whose result changes without a post from this script (ex. polling the snapshot job status).
+'''
+def get(url, stream=False, cache=True):
+
+    dn, key = cache_key(url) if GET_CACHE == True and cache == True and stream == False else (None, None)
+
+    if key != None:
+        with get_cache_lock:
+            if key in get_cache:
+                get_cache.move_to_end(key)
+                return(get_cache[key])
+
+    throttle()
+    response = session.get(url, stream=stream)
+
+    if key != None and response.status_code == 200:
+        with get_cache_lock:
+            get_cache[key] = response
+            while len(get_cache) > GET_CACHE_SIZE:
+                get_cache.popitem(last=False)
+
+    return(response)
+
+
+'''
+This function drops the cached GETs a write to dn could have changed: the dn itself, anything under it and its parents
+(their subtree queries include it). topology/ objects are resolved from policy, so they are dropped on any write.
+'''
+def invalidate_gets(fabric, dn):
+
+    with get_cache_lock:
+        for key in list(get_cache.keys()):
+            if not key.startswith(fabric.lower() + "/"):
+                continue
+            cached = cache_key(key)[0]
+            if dn == None or cached.startswith(dn) or dn.startswith(cached) or cached.startswith("topology/"):
+                del get_cache[key]
+
+
+'''
+This function posts to the fabric. A successful post removes the cached GETs and class results the write could have changed.
+'''
+def post(url, data):
+    throttle()
+    response = session.post(url, data=data)
+
+    if response.status_code == 200:
+        dn = re.findall(r'/api/node/mo/(.+?)\.json(?:\?|$)', url)
+        dn = dn[0] if dn != [] else None
+        host = re.findall(r'^https?://[^/]+', url)[0]
+        invalidate_gets(host, dn)
+        mo_cache.invalidate(host, dn)
+
+    return(response)
+
+
+'''
+This function parses a response body (str or bytes) with orjson if it is installed, otherwise with json
+'''
+def loads(body):
+
+    if orjson != None:
+        return(orjson.loads(body))
+
+    return(json.loads(body))
+
+
+'''
+This function parses the imdata objects of a streamed response one at a time, so the response text is never held
+in memory as a whole. Returns (imdata, totalCount).
+'''
+def stream_imdata(response):
+
+    response.raw.decode_content = True
+
+    total = []
+    def events():
+        for prefix, event, value in ijson.parse(response.raw):
+            if prefix == "totalCount":
+                total.append(int(value))
+            yield prefix, event, value
+
+    imdata = list(ijson.items(events(), "imdata.item"))
+
+    return(imdata, total[0] if total != [] else len(imdata))
+
+
+'''
+This function gets one page of a query. Returns (imdata, totalCount) or None if the request fails.
+'''
+def get_page(url, page, page_size):
+
+    stream = STREAM_JSON == True and ijson != None
+
+    response = get(url + "page=" + str(page) + "&page-size=" + str(page_size), stream, cache=False)
+
+    if response.status_code != 200:
+        print("ERROR! Could not retrieve page " + str(page) + " of " + url + ". response: " + str(response))
+        response.close()
+        return
+
+    if stream == True:
+        return(stream_imdata(response))
+
+    response_json = loads(response.content)
+    return(response_json["imdata"], int(response_json["totalCount"]))
+
+
+'''
+This function pages through a query with page/page-size and yields the imdata list of each page. The next page is
+requested in the background while the caller works on the current one, so at most two pages are held in memory.
+Class queries are ordered by dn so objects don't move between pages. If a page fails, None is yielded and the loop stops.
+If label is set, progress is printed against totalCount after each page.
+Classes listed in mo_cache.CLASSES are served from the on-disk cache when possible and saved to it once every page is read.
+'''
+def iter_pages(url, page_size=PAGE_SIZE, label=None):
+
+    cached = mo_cache.lookup(url)
+    if cached != None:
+        if label != None:
+            print(label + ": " + str(len(cached)) + "/" + str(len(cached)) + " (cached)")
+        yield cached
+        return
+
+    collected = [] if mo_cache.ENABLED == True and mo_cache.class_of(url) != None else None
+
+    query = "&" if "?" in url else "?"
+    cls = re.findall(r'/class/(?:.+/)?(\w+)\.json', url)
+    if cls != [] and "order-by=" not in url:
+        query = query + "order-by=" + cls[0] + ".dn&"
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        page = 0
+        count = 0
+        future = pool.submit(get_page, url + query, page, page_size)
+
+        while True:
+            result = future.result()
+
+            if result == None:
+                yield None
+                return
+
+            imdata, total = result
+            page += 1
+            count += len(imdata)
+            last = imdata == [] or page * page_size >= total
+
+            #prefetches the next page before handing this one to the caller
+            if last == False:
+                future = pool.submit(get_page, url + query, page, page_size)
+
+            if label != None:
+                print(label + ": " + str(count) + "/" + str(total))
+
+            if collected != None:
+                collected.extend(imdata)
+                if last == True:
+                    mo_cache.store(url, collected)
+
+            yield imdata
+
+            if last == True:
+                return
+
+
+'''
+This function yields the objects of a paginated query one at a time. If a page fails, None is yielded and the loop stops.
+'''
+def iter_objects(url, page_size=PAGE_SIZE, label=None):
+
+    for page in iter_pages(url, page_size, label):
+        if page == None:
+            yield None
+            return
+        for item in page:
+            yield item
+
+
+'''
+This function returns the combined imdata list of every page. Returns None if any page fails.
+'''
+def get_pages(url, page_size=PAGE_SIZE):
+
+    imdata = []
+    for page in iter_pages(url, page_size):
+        if page == None:
+            return
+        imdata.extend(page)
+
+    return(imdata)
+
+
+'''
+This function splits a list of child objects into chunks whose json size stays under max_bytes
+'''
+def chunk_children(children, max_bytes=MAX_PAYLOAD):
+
+    chunk = []
+    size = 0
+    for child in children:
+        child_size = len(json.dumps(child)) + 1
+        if chunk != [] and size + child_size > max_bytes:
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(child)
+        size += child_size
+
+    if chunk != []:
+        yield chunk
+
+
+'''
+This function posts many child objects under one parent object (ex. infraInfra, fvTenant) in size bounded chunks.
+The APIC commits each chunk as a single transaction. Returns a list of (chunk, response).
+'''
+def post_bulk(url, parent_class, parent_attributes, children, max_bytes=MAX_PAYLOAD):
+
+    results = []
+    for chunk in chunk_children(children, max_bytes):
+        payload = {parent_class: {"attributes": parent_attributes, "children": chunk}}
+        response = post(url, data=json.dumps(payload))
+        results.append((chunk, response))
+
+    return(results)
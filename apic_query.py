@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+'''
+   Builds APIC class and MO query urls so the filtering and pruning is done by the APIC instead of in the scripts.
+
+   example:
+       apic_query.class_url(fabric, "fabricNode", filter=apic_query.and_(apic_query.eq("fabricNode.fabricSt", "active"), apic_query.eq("fabricNode.role", "leaf")))
+       -> https://.../api/node/class/fabricNode.json?query-target-filter=and(eq(fabricNode.fabricSt,"active"),eq(fabricNode.role,"leaf"))
+
+   Options are passed as keyword arguments. The common ones have short names (see OPTIONS), anything else is
+   sent as is with _ changed to - (ex. target_node="all" -> target-node=all). Lists are joined with commas.
+
+
+    File name: apic_query.py
+    Author: Nicholas Bogdajewicz
+    Date created: 10/18/2026
+    Date last modified: 10/18/2026
+    Python Version: 3.8.2
+'''
+
+#short names for the query options the scripts use
+OPTIONS = {
+    "filter": "query-target-filter",
+    "target": "query-target",
+    "target_class": "target-subtree-class",
+    "subtree": "rsp-subtree",
+    "subtree_class": "rsp-subtree-class",
+    "subtree_include": "rsp-subtree-include",
+    "subtree_filter": "rsp-subtree-filter",
+    "props": "rsp-prop-include",
+    "order_by": "order-by",
+}
+
+
+'''
+Filter expressions. prop is class.property (ex. fvBD.name), value is quoted for the APIC.
+'''
+def compare(op, prop, value):
+    return(op + "(" + prop + ",\"" + str(value) + "\")")
+
+
+def eq(prop, value):
+    return(compare("eq", prop, value))
+
+
+def ne(prop, value):
+    return(compare("ne", prop, value))
+
+
+def lt(prop, value):
+    return(compare("lt", prop, value))
+
+
+def le(prop, value):
+    return(compare("le", prop, value))
+
+
+def gt(prop, value):
+    return(compare("gt", prop, value))
+
+
+def ge(prop, value):
+    return(compare("ge", prop, value))
+
+
+def wcard(prop, value):
+    return(compare("wcard", prop, value))
+
+
+def and_(*filters):
+    return("and(" + ",".join(filters) + ")")
+
+
+def or_(*filters):
+    return("or(" + ",".join(filters) + ")")
+
+
+def not_(expression):
+    return("not(" + expression + ")")
+
+
+'''
+This function builds the query string (including the ?) from keyword options. Options set to None are left out.
+Returns an empty string if there are no options.
+'''
+def query(**options):
+
+    params = []
+    for name, value in options.items():
+        if value == None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = ",".join(value)
+        params.append(OPTIONS.get(name, name.replace("_", "-")) + "=" + str(value))
+
+    if params == []:
+        return("")
+
+    return("?" + "&".join(params))
+
+
+'''
+This function returns a class query url. scope limits the query to part of the tree (ex. topology/pod-1/node-101).
+'''
+def class_url(fabric, cls, scope=None, **options):
+
+    if scope != None:
+        return(fabric + "/api/node/class/" + scope + "/" + cls + ".json" + query(**options))
+
+    return(fabric + "/api/node/class/" + cls + ".json" + query(**options))
+
+
+def mo_url(fabric, dn, **options):
+    return(fabric + "/api/node/mo/" + dn + ".json" + query(**options))
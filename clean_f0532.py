@@ -12,71 +12,248 @@
     requests version: 2.27.0
 '''
 
-import get_token
+import apic_client
+import apic_query
 import snapshot
 
 import sys
-import time
-import requests
 import json
 import datetime
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from logging.handlers import RotatingFileHandler
+import argparse
+import os
 
 #Logs into fabric and saves token, url and change number
-login = get_token.get_token()
+login = apic_client.login()
 token = login[0]
 fabric = login[1]
 change = login[2]
-timer = time.time()
+
+#indexes built by prefetch()
+index = {}
+
+#worker threads for evaluating faults and for removing static ports, and the max requests per second sent to the APIC
+EVALUATE_WORKERS = 4
+REMOVE_WORKERS = 8
+RATE_LIMIT = 5
+
+#most nodes prefetch() filters on, past this the interface state for the whole fabric is pulled
+PREFETCH_NODES = 20
+
+#stores the lastTransition watermark and processed fault dns between runs, one file per fabric
+STATE_FILE = "cache/clean_f0532_state_" + apic_client.fabric_name() + ".json"
+
+#--full-rescan ignores the watermark and evaluates every F0532 fault older than 30 days
+parser = argparse.ArgumentParser()
+parser.add_argument("--full-rescan", dest="full_rescan", action="store_true", help='Ignore the saved watermark and evaluate every F0532 fault')
+args = parser.parse_known_args()[0]
+
+#each worker collects the output for its fault here so it can be printed in fault order
+output = threading.local()
+
+#Logs to file
+os.makedirs("logs", exist_ok=True)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s.%(msecs)03d] [%(levelname)s] [%(filename)s] [%(funcName)s():%(lineno)s] %(message)s', handlers=[RotatingFileHandler('logs/clean_f0532_' + apic_client.fabric_name() + '.log', maxBytes=1000000, backupCount=1)])
+logger = logging.getLogger(__name__)
 
 
 '''
-This function will grab all F0532 faults that are greater than X days
+This function saves a line of output for the fault the current worker is processing
 '''
-def get_f0532():
-    global token, timer
+def log(message):
+    if getattr(output, "lines", None) == None:
+        print(message)
+    else:
+        output.lines.append(message)
 
-    #Creates variable for X number of days before current date
-    start_date = datetime.date.today() - datetime.timedelta(30)
 
-    c_timer = time.time()
-    d_timer = c_timer - timer
-    if d_timer >= 540:
-        token = get_token.refresh_token(fabric, token)
-        timer = time.time()
+'''
+This function saves an error line and marks the fault the current thread is processing as failed, so it is retried next run
+'''
+def fail(message):
+    log(message)
+    output.failed = True
+
+
+'''
+This function loads the saved state for the fabric. {"watermark": date of the last run's cutoff, "processed": {fault dn: lastTransition}}
+'''
+def load_state():
+
+    state = {"watermark": None, "processed": {}}
+
+    if os.path.exists(STATE_FILE):
+        try:
+            with open(STATE_FILE) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            print("Could not read " + STATE_FILE + ", running a full rescan.")
+
+    return(state)
+
+
+'''
+This function saves the state for the fabric. The watermark is held back to the oldest fault that failed, so failed faults
+are queried again next run, and "processed" keeps the faults from after the watermark that don't need to be processed again.
+Processed faults from before the watermark are dropped as they are never queried again.
+'''
+def save_state(state):
+
+    state["processed"] = {dn: last for dn, last in state["processed"].items() if last >= state["watermark"]}
+
+    #writes to a temp file first so an interrupted run never leaves a partly written state file
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    with open(STATE_FILE + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(STATE_FILE + ".tmp", STATE_FILE)
+
+
+'''
+This function will grab all F0532 faults that are greater than X days. Unless full_rescan is set only faults that
+transitioned since the last run's watermark, and that haven't been processed with the same lastTransition, are returned.
+'''
+def get_f0532(start_date, state, full_rescan=False):
 
     #Sends API request for F0532 faults before start_date and saves as response_json
-    url = fabric + f"/api/node/class/faultInst.json?query-target-filter=and(and(eq(faultInfo.code,\"F0532\")),lt(faultInfo.lastTransition, \"{start_date}\"))"
+    filters = [apic_query.eq("faultInfo.code", "F0532"), apic_query.lt("faultInfo.lastTransition", start_date)]
+    if full_rescan == False and state["watermark"] != None:
+        filters.append(apic_query.ge("faultInfo.lastTransition", state["watermark"]))
 
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
+    url = apic_query.class_url(fabric, "faultInst", filter=apic_query.and_(*filters))
 
-    requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
+    #pages through the faults and drops faults already processed with the same lastTransition as they arrive
+    response_json = {"imdata": []}
+    for item in apic_client.iter_objects(url, label="F0532 faults"):
 
-    #If not status code 200, skip request
-    if response.status_code != 200:
-        print("ERROR! Could not get the list of F0532 faults. response: " + str(response))
-        sys.exit()
+        #If a page fails, stop
+        if item == None:
+            print("ERROR! Could not get the list of F0532 faults.")
+            sys.exit()
 
-    response_json = json.loads(response.text)
+        if full_rescan == False and state["processed"].get(item["faultInst"]["attributes"]["dn"]) == item["faultInst"]["attributes"]["lastTransition"]:
+            continue
+
+        response_json["imdata"].append(item)
 
     #Formats date and counts number of faults then prints it
     olddate = start_date.strftime("%Y-%m-%d")
     fault_count = str(len(response_json["imdata"]))
-    print("\n" + fault_count + " F0532 faults are older than: " + olddate + "\n")
+    if full_rescan == True or state["watermark"] == None:
+        print("\n" + fault_count + " F0532 faults are older than: " + olddate + "\n")
+    else:
+        print("\n" + fault_count + " new F0532 faults between " + state["watermark"] + " and " + olddate + "\n")
 
     #logs and returns faults
     return(response_json)
 
 
+'''
+This function returns the nodes the faults are on, plus their vPC peers as vpcs are checked on both nodes
+'''
+def fault_nodes(faults):
+
+    nodes = set()
+    for item in faults:
+        for node in re.findall(r'(?<=node-)\d+', item["faultInst"]["attributes"]["dn"]):
+            nodes.update([node, str(int(node) + 1) if int(node) % 2 == 1 else str(int(node) - 1)])
+
+    return(sorted(nodes))
+
+
+'''
+This function pulls the interface state, port-channel membership, vPC and static path classes in a handful of paginated
+class queries and builds the indexes the per-fault logic runs against. With nodes set, the interface classes are only
+pulled for those nodes (up to PREFETCH_NODES, past that the whole fabric is pulled). Static paths are always pulled fabric-wide.
+'''
+def prefetch(nodes=None):
+    global index
+
+    index = {
+        "phys": {},          #(node, eth) -> {"operSt", "usage"}
+        "members": {},       #(node, po) -> [eth, ...]
+        "member_of": {},     #(node, eth) -> po
+        "policy_group": {},  #(node, po) -> policy group name
+        "vpc": {},           #(node, po) -> {"vpc_id", "dom_id"}
+        "vpc_if": {},        #(node, dom_id, vpc_id) -> po
+        "po_fault": set(),   #(node, po) with an F0532 fault
+        "epg": {},           #static path tDn -> [epg dn, ...]
+    }
+
+    if nodes != None and len(nodes) > PREFETCH_NODES:
+        nodes = None
+
+    #limits a class query to the nodes with faults
+    def on_nodes(cls, *filters):
+        if nodes != None:
+            filters = filters + (apic_query.or_(*[apic_query.wcard(cls + ".dn", "/node-" + node + "/") for node in nodes]),)
+        if filters == ():
+            return(apic_query.class_url(fabric, cls))
+        if len(filters) == 1:
+            return(apic_query.class_url(fabric, cls, filter=filters[0]))
+        return(apic_query.class_url(fabric, cls, filter=apic_query.and_(*filters)))
+
+    queries = {
+        "ethpmPhysIf": on_nodes("ethpmPhysIf"),
+        "pcRsMbrIfs": on_nodes("pcRsMbrIfs"),
+        "pcRtAccBndlGrpToAggrIf": on_nodes("pcRtAccBndlGrpToAggrIf"),
+        "pcRtVpcConf": on_nodes("pcRtVpcConf"),
+        "vpcRsVpcConf": on_nodes("vpcRsVpcConf"),
+        "faultInst": on_nodes("faultInst", apic_query.eq("faultInst.code", "F0532"), apic_query.wcard("faultInst.dn", "/aggr-")),
+        "fvRsPathAtt": apic_query.class_url(fabric, "fvRsPathAtt", props="config-only"),
+    }
+
+    if nodes == None:
+        print("Pre-fetching interface state for the fabric...")
+    else:
+        print("Pre-fetching interface state for nodes " + ", ".join(nodes) + "...")
+
+    for cls, query in queries.items():
+        imdata = apic_client.get_pages(query)
+
+        if imdata == None:
+            print("ERROR! Could not retrieve " + cls + " for the fabric.")
+            sys.exit()
+
+        for item in imdata:
+            attributes = item[cls]["attributes"]
+            dn = attributes["dn"]
+            node = re.findall(r'(?<=node-)\d+', dn)
+            node = node[0] if node != [] else ""
+            aggr = re.findall(r'(?<=aggr-\[).+?(?=\])', dn)
+
+            if cls == "ethpmPhysIf":
+                eth = re.findall(r'(?<=phys-\[).+?(?=\])', dn)[0]
+                index["phys"][(node, eth)] = {"operSt": attributes["operSt"], "usage": attributes["usage"]}
+            elif cls == "pcRsMbrIfs":
+                index["members"].setdefault((node, aggr[0]), []).append(attributes["tSKey"])
+                index["member_of"][(node, attributes["tSKey"])] = aggr[0]
+            elif cls == "pcRtAccBndlGrpToAggrIf":
+                index["policy_group"][(node, aggr[0])] = re.findall('(?<=accbundle-).*$', attributes["tDn"])[0]
+            elif cls == "pcRtVpcConf":
+                dom_id = re.findall(r'(?<=dom-)\d+', attributes["tDn"])[0]
+                index["vpc"][(node, aggr[0])] = {"vpc_id": attributes["tSKey"], "dom_id": dom_id}
+            elif cls == "vpcRsVpcConf":
+                dom_id = re.findall(r'(?<=dom-)\d+', dn)[0]
+                vpc_id = re.findall(r'(?<=/if-)\d+', dn)[0]
+                index["vpc_if"][(node, dom_id, vpc_id)] = attributes["tSKey"]
+            elif cls == "faultInst":
+                if aggr != []:
+                    index["po_fault"].add((node, aggr[0]))
+            elif cls == "fvRsPathAtt":
+                epg = dn.split("/rspathAtt-")[0]
+                index["epg"].setdefault(attributes["tDn"], []).append(epg)
+
+    print("Pre-fetch complete.\n")
+
+
 '''
 This function determines if the interface is a standalone interface, port-channel or vpc.
 '''
 def split_int(item):
-    global token, timer
-
     #grabs node id and interface
     node_intf = item["faultInst"]["attributes"]["dn"]
     reg = re.findall(r'\w+', node_intf)
@@ -84,449 +261,164 @@ def split_int(item):
     intfs = reg[7]
     eths = "/" + reg[8]
 
-
-    #splits eth and po interfaces into seperate lists
+    #splits eth and po interfaces
     if re.search('eth.+', intfs):
-        eth_int = {"node": nodes, "interface": intfs + eths}
-    else:
-        po_int = {"node": nodes, "interface": intfs}
-        eth_int = {}
-
-    #Checks if ethernet interface is in a port-channel or not
-    if eth_int != {}:
-        node = str(eth_int["node"])
-        intf = (eth_int["interface"])
-
-        c_timer = time.time()
-        d_timer = c_timer - timer
-        if d_timer >= 540:
-            token = get_token.refresh_token(fabric, token)
-            timer = time.time()
-
-        url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/phys-[" + intf + "].json?query-target=children&target-subtree-class=relnFrom"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
-
-        #If not status code 200, skip request
-        if response.status_code != 200:
-            print("ERROR! Could not determine if node " + node + " interface " + intf + " is in a port-channel or not.")
+        eth = intfs + eths
+        #Checks if ethernet interface is in a port-channel or not
+        if (nodes, eth) not in index["member_of"]:
+            return {"type": "standalone", "node": nodes, "interface": eth}
+        po = index["member_of"][(nodes, eth)]
+        #checks if fault exists on po, if so skip to avoid duplicates
+        if (nodes, po) in index["po_fault"]:
             return
+    else:
+        po = intfs
 
-        response_json = json.loads(response.text)
-
-        child_obj = response_json["imdata"]
-
-        if any("l1RtMbrIfs" in d for d in child_obj):
-            #if so grab the po id and move to vpc check
-            sort = sorted(child_obj, key=lambda d: list(d.keys()), reverse=True)
-            po_id = sort[2]["l1RtMbrIfs"]["attributes"]["tSKey"]
-            po_int = {"node": eth_int["node"], "interface": po_id}
-            #checks if fault exists on po, if so skip to avoid duplicates
-            c_timer = time.time()
-            d_timer = c_timer - timer
-            if d_timer >= 540:
-                token = get_token.refresh_token(fabric, token)
-                timer = time.time()
-
-            url = fabric + "/api/node/mo/topology/pod-1/node-" + po_int["node"] + "/sys/aggr-[" + po_int["interface"] + "].json?rsp-subtree-include=faults,no-scoped,subtree&query-target-filter=eq(faultInst.code, \"F0532\")"
-            headers = {
-                "Cookie" : f"APIC-Cookie={token}", 
-            }
-            requests.packages.urllib3.disable_warnings()
-            response = requests.get(url, headers=headers, verify=False)
-
-            #If not status code 200, skip request
-            if response.status_code != 200:
-                print("ERROR! Could not determine if node " + po_int["node"] + " interface " + po_int["po_id"] + " has fault F0532.")
-                return
+    #determines if po interface is part of a vpc or not. as well as grabbing policy group info and vpc ids
+    if (nodes, po) not in index["policy_group"]:
+        fail("ERROR! Could not determine the policy group for node " + nodes + " interface " + po + ".")
+        return
 
-            response_json = json.loads(response.text)
+    policy_group = index["policy_group"][(nodes, po)]
 
-            if response_json["imdata"] != []:
+    if (nodes, po) in index["vpc"]:
+        vpc = index["vpc"][(nodes, po)]
+        #vpcs are processed from the odd node, so a fault on the even node is mapped to the odd nodes port-channel
+        if int(nodes) % 2 == 0:
+            nodes = str(int(nodes) - 1)
+            po = index["vpc_if"].get((nodes, vpc["dom_id"], vpc["vpc_id"]))
+            if po == None:
                 return
-
-        else:
-            #if not return to main for loop
-            eth_int = {"type": "standalone", "node": eth_int["node"], "interface": eth_int["interface"]}
-            return eth_int
+        return {"type": "VPC", "node": nodes, "interface": po, "vpc_id": vpc["vpc_id"], "dom_id": vpc["dom_id"], "policy_group": policy_group}
+    else:
+        return {"type": "port-channel", "node": nodes, "interface": po, "policy_group": policy_group}
 
 
-    #determines in po interface is part of a vpc or not
-    c_timer = time.time()
-    d_timer = c_timer - timer
-    if d_timer >= 540:
-        token = get_token.refresh_token(fabric, token)
-        timer = time.time()
+'''
+This function returns the operational state and first usage keyword for each member interface of a port-channel
+'''
+def member_status(node, po):
 
-    url = fabric + "/api/node/mo/topology/pod-1/node-" + po_int["node"] + "/sys/aggr-[" + po_int["interface"] + "].json?query-target=children&target-subtree-class=relnFrom"
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
-    requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
+    status = []
+    usage = []
+    for eth in index["members"].get((node, po), []):
+        if (node, eth) not in index["phys"]:
+            fail("ERROR! Could not determine if node " + node + " interface " + eth + " is down or not.")
+            return(None, None)
+        status.append(index["phys"][(node, eth)]["operSt"])
+        usage.append(re.findall(r'\w+', index["phys"][(node, eth)]["usage"])[0])
 
-    #If not status code 200, skip request
-    if response.status_code != 200:
-        print("ERROR! Could not determine if node " + po_int["node"] + " interface " + po_int["interface"] + " is in a VPC or not.")
-        return
-
-    response_json = json.loads(response.text)
-
-    child_obj = response_json["imdata"]
-
-    #checks if vpc attribute exists and splits po and vpc int. as well as grabbing policy group info and vpc ids
-    if any("pcRtVpcConf" in d for d in child_obj):
-        if int(po_int["node"]) % 2 != 0:
-            sort = sorted(child_obj, key=lambda d: list(d.keys()), reverse=True)
-            vpc_id = sort[0]["pcRtVpcConf"]["attributes"]["tSKey"]
-            dom_id = sort[0]["pcRtVpcConf"]["attributes"]["tDn"]
-            reg = re.findall(r'\w+', dom_id)
-            policy_group = sort[1]["pcRtAccBndlGrpToAggrIf"]["attributes"]["tDn"]
-            reg2 = re.findall('(?<=accbundle-).*$', policy_group)[0]
-            vpc_int = {"type": "VPC", "node": po_int["node"], "interface": po_int["interface"], "vpc_id": vpc_id, "dom_id": reg[9], "policy_group": reg2}
-            return vpc_int
-        else: 
-            return
-    else:
-        sort = sorted(child_obj, key=lambda d: list(d.keys()), reverse=True)
-        policy_group = sort[0]["pcRtAccBndlGrpToAggrIf"]["attributes"]["tDn"]
-        reg = re.findall('(?<=accbundle-).*$', policy_group)[0]
-        po_int = {"type": "port-channel", "node": po_int["node"], "interface": po_int["interface"], "policy_group": reg}
-        return po_int
+    return(status, usage)
 
 
 '''
 This function verify if the physical interface is up for both phy and po interfaces
 '''
 def int_status(item):
-    global token, timer
+
+    node = str(item["node"])
+    intf = item["interface"]
 
     #checks standalone interfaces to confirm they are not up
     if item["type"] == "standalone":
-        node = str(item["node"])
-        intf = item["interface"]
-
-        c_timer = time.time()
-        d_timer = c_timer - timer
-        if d_timer >= 540:
-            token = get_token.refresh_token(fabric, token)
-            timer = time.time()
-
-        url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/phys-[" + intf + "].json?query-target=children&target-subtree-class=ethpmPhysIf"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
 
-        #If not status code 200, skip request
-        if response.status_code != 200:
-            print("ERROR! Could not determine if node " + node + " interface " + intf + " is down or not.")
+        if (node, intf) not in index["phys"]:
+            fail("ERROR! Could not determine if node " + node + " interface " + intf + " is down or not.")
             return
 
-        response_json = json.loads(response.text)
-
         #grabs the status and operation state. ignores if up or admin shut.
-        child_obj = response_json["imdata"][0]["ethpmPhysIf"]["attributes"]["operSt"]
-        blck = response_json["imdata"][0]["ethpmPhysIf"]["attributes"]["usage"]
+        child_obj = index["phys"][(node, intf)]["operSt"]
+        blck = index["phys"][(node, intf)]["usage"]
 
         if blck == "blacklist" or blck == "blacklist,epg":
-            print("Skipping interface as it's admin disabled.")
+            log("Skipping interface as it's admin disabled.")
             return
         elif child_obj == "up":
-            print("Skipping interface as its operational state is up.")
+            log("Skipping interface as its operational state is up.")
             return
         elif child_obj == "down" and blck == "epg":
-            print("Interface is down and not admin disabled.")
+            log("Interface is down and not admin disabled.")
             return item
         else:
-            print("Skipping interface as its state is unknown.")
+            log("Skipping interface as its state is unknown.")
             return
 
-    #checks po interfaces to confirm they are not up. Gets physical interfaces in the port channel
-    if item["type"] == "port-channel" or item["type"] == "VPC":    
-        node = str(item["node"])
-        intf = (item["interface"])
-
-        c_timer = time.time()
-        d_timer = c_timer - timer
-        if d_timer >= 540:
-            token = get_token.refresh_token(fabric, token)
-            timer = time.time()
+    #checks po interfaces to confirm they are not up
+    status, usage = member_status(node, intf)
+    if status == None:
+        return
 
-        url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/aggr-[" + intf + "].json?query-target=children&target-subtree-class=pcRsMbrIfs"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
+    #if any up interfaces in list ignore
+    if "blacklist" in usage or "blacklist,epg" in usage:
+        log("Skipping, interface in port-channel is admin disabled.")
+        return
+    elif "up" in status:
+        log("Skipping, interface in port-channel operational state is up.")
+        return
+    elif not ("down" in status and "epg" in usage):
+        log("Skipping, interface in port-channel state is unknown.")
+        return
 
-        #If not status code 200, skip request
-        if response.status_code != 200:
-            print("ERROR! Could not determine if node " + node + " interface " + intf + " is down or not.")
-            return
+    log("Interfaces in port-channel are down and not admin disabled.")
 
-        response_json = json.loads(response.text)
-        
-        child_obj = response_json["imdata"]
-
-        phy_int = []
-        #loops through phy interfaces and saves in list
-        for phy in child_obj:
-            phy_int.append(phy["pcRsMbrIfs"]["attributes"]["tSKey"])
-
-        #loops through the list and checks the interface status
-        status = []
-        usage = []
-        for stat in phy_int:
-            c_timer = time.time()
-            d_timer = c_timer - timer
-            if d_timer >= 540:
-                token = get_token.refresh_token(fabric, token)
-                timer = time.time()
-                
-            url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/phys-[" + stat + "].json?query-target=children&target-subtree-class=ethpmPhysIf"
-            headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-            }
-            requests.packages.urllib3.disable_warnings()
-            response = requests.get(url, headers=headers, verify=False)
-
-            #If not status code 200, skip request
-            if response.status_code != 200:
-                print("ERROR! Could not determine if node " + node + " interface " + stat + " is down or not.")
-                return
+    if item["type"] == "port-channel":
+        return item
 
-            response_json = json.loads(response.text)
-            op_stat = response_json["imdata"][0]["ethpmPhysIf"]["attributes"]["operSt"]
-            blck = response_json["imdata"][0]["ethpmPhysIf"]["attributes"]["usage"]
-            reg = re.findall(r'\w+', blck)
-            status.append(op_stat)
-            usage.append(reg[0])
-
-        #if any up interfaces in list ignore
-        if item["type"] == "port-channel":
-            if "blacklist" in usage or "blacklist,epg" in usage:
-                print("Skipping, interface in port-channel is admin disabled.")
-                return
-            elif "up" in status:
-                print("Skipping, interface in port-channel operational state is up.")
-                return
-            elif "down" in status and "epg" in usage:
-                print("Interfaces in port-channel are down and not admin disabled.")
-                return item
-            else:
-                print("Skipping, interface in port-channel state is unknown.")
-                return
+    #checks vpc peer interfaces
+    peer = str(int(node) + 1)
+    po = index["vpc_if"].get((peer, item["dom_id"], item["vpc_id"]))
+    if po == None:
+        fail("ERROR! Could not determine if node " + node + " VPC peers interfaces are down or not.")
+        return
 
-        #if any up interfaces in list ignore
-        if item["type"] == "VPC":
-            if "blacklist" in usage or "blacklist,epg" in usage:
-                print("Skipping, interface in port-channel is admin disabled.")
-                return
-            elif "up" in status:
-                print("Skipping, interface in port-channel operational state is up.")
-                return
-            elif "down" in status and "epg" in usage:
-                print("Interfaces in port-channel are down and not admin disabled.")
-
-                #checks vpc peer interfaces
-                dom = item["dom_id"]
-                vpc = item["vpc_id"]
-
-                c_timer = time.time()
-                d_timer = c_timer - timer
-                if d_timer >= 540:
-                    token = get_token.refresh_token(fabric, token)
-                    timer = time.time()
-
-                url = fabric + "/api/node/mo/topology/pod-1/node-" + str(int(node) + 1) + "/sys/vpc/inst/dom-" + dom + "/if-" + vpc + ".json?query-target=children&target-subtree-class=vpcRsVpcConf"
-                headers = {
-                    "Cookie" : f"APIC-Cookie={token}", 
-                }
-                requests.packages.urllib3.disable_warnings()
-                response = requests.get(url, headers=headers, verify=False)
-                #If not status code 200, skip request
-                if response.status_code != 200:
-                    print("ERROR! Could not determine if node " + node + " VPC peers interfaces are down or not.")
-                    return
-
-                response_json = json.loads(response.text)
-                po = response_json["imdata"][0]["vpcRsVpcConf"]["attributes"]["tSKey"]
-
-                c_timer = time.time()
-                d_timer = c_timer - timer
-                if d_timer >= 540:
-                    token = get_token.refresh_token(fabric, token)
-                    timer = time.time()
-
-                url = fabric + "/api/node/mo/topology/pod-1/node-" + str(int(node) + 1) + "/sys/aggr-[" + po + "].json?query-target=children&target-subtree-class=pcRsMbrIfs"
-                headers = {
-                    "Cookie" : f"APIC-Cookie={token}", 
-                }
-                requests.packages.urllib3.disable_warnings()
-                response = requests.get(url, headers=headers, verify=False)
-                #If not status code 200, skip request
-                if response.status_code != 200:
-                    print("ERROR! Could not determine if node " + node + " VPC peers interfaces are down or not.")
-                    return
-
-                response_json = json.loads(response.text)
-                child_obj = response_json["imdata"]
-
-                phy_int = []
-                #loops through phy interfaces and saves in list
-                for phy in child_obj:
-                    phy_int.append(phy["pcRsMbrIfs"]["attributes"]["tSKey"])
-
-                #loops through the list and checks the interface status
-                status = []
-                usage = []
-                for stat in phy_int:
-
-                    c_timer = time.time()
-                    d_timer = c_timer - timer
-                    if d_timer >= 540:
-                        token = get_token.refresh_token(fabric, token)
-                        timer = time.time()
-
-                    url = fabric + "/api/node/mo/topology/pod-1/node-" + str(int(node) + 1) + "/sys/phys-[" + stat + "].json?query-target=children&target-subtree-class=ethpmPhysIf"
-                    headers = {
-                        "Cookie" : f"APIC-Cookie={token}", 
-                    }
-                    requests.packages.urllib3.disable_warnings()
-                    response = requests.get(url, headers=headers, verify=False)
-
-                    response_json = json.loads(response.text)
-                    op_stat = response_json["imdata"][0]["ethpmPhysIf"]["attributes"]["operSt"]
-                    blck = response_json["imdata"][0]["ethpmPhysIf"]["attributes"]["usage"]
-                    reg = re.findall(r'\w+', blck)
-                    status.append(op_stat)
-                    usage.append(reg[0])
-                #if any up interfaces in list ignore.
-                if "blacklist" in usage or "blacklist,epg" in usage:
-                    print("Skipping, interface in VPC peers port-channel is admin disabled.")
-                    return
-                elif "up" in status:
-                    print("Skipping, interface in VPC peers port-channel operational state is up.")
-                    return
-                elif "down" in status and "epg" in usage:
-                    print("Interfaces in VPC peers port-channel are down and not admin disabled.")
-                    return item
-                else:
-                    print("Skipping, interface in VPC peers port-channel state is unknown.")
-                    return
+    status, usage = member_status(peer, po)
+    if status == None:
+        return
 
-            else:
-                print("Skipping, interface in port-channel state is unknown.")
-                return
+    #if any up interfaces in list ignore.
+    if "blacklist" in usage or "blacklist,epg" in usage:
+        log("Skipping, interface in VPC peers port-channel is admin disabled.")
+        return
+    elif "up" in status:
+        log("Skipping, interface in VPC peers port-channel operational state is up.")
+        return
+    elif "down" in status and "epg" in usage:
+        log("Interfaces in VPC peers port-channel are down and not admin disabled.")
+        return item
+    else:
+        log("Skipping, interface in VPC peers port-channel state is unknown.")
+        return
 
 
 '''
-This function will grab all epgs for down interfaces
+This function will grab all epgs for down interfaces from the static path index
 '''
 def get_epg(item):
-    global token, timer
-
-    if item["type"] == "standalone":
-        node = str(item["node"])
-        intf = item["interface"]
-
-        c_timer = time.time()
-        d_timer = c_timer - timer
-        if d_timer >= 540:
-            token = get_token.refresh_token(fabric, token)
-            timer = time.time()
-
-        url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/phys-[" + intf + "].json?rsp-subtree-include=full-deployment&target-node=all&target-path=l1EthIfToEPg"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
-        #If not status code 200, skip request
-        if response.status_code != 200:
-            print("ERROR! Could not determine EPGs on node " + node + " interface " + intf)
-            return
-
-        response_json = json.loads(response.text)
-
-        obj = response_json["imdata"][0]["l1PhysIf"]
-
-        #checks if any epgs exist
-        if any("children" in d for d in obj):
-            child_obj = response_json["imdata"][0]["l1PhysIf"]["children"][0]["pconsCtrlrDeployCtx"]["children"]
-        else:
-            print("No EPGs detected on node " + node + " interface " + intf)
-            return
-
-        #appends list of epgs to dictionary
-        list1 = []
-        for dic in child_obj:
-            for val in dic.values():
-                if not isinstance(val, dict):
-                    print(val)
-            else:
-                for val2 in val.values():
-                    list1.append(val2["ctxDn"])
-        
-        item["epg"] = list1
-        return item
-
-
-    if item["type"] == "port-channel" or item["type"] == "VPC":
-        node = str(item["node"])
-        intf = item["interface"]
-
-        c_timer = time.time()
-        d_timer = c_timer - timer
-        if d_timer >= 540:
-            token = get_token.refresh_token(fabric, token)
-            timer = time.time()
-
-        url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/aggr-" + intf + ".json?rsp-subtree-include=full-deployment&target-node=all&target-path=l1EthIfToEPg"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
-        #If not status code 200, skip request
-        if response.status_code != 200:
-            print("ERROR! Could not determine EPGs on node " + node + " interface " + intf)
-            return
 
-        response_json = json.loads(response.text)
+    node = str(item["node"])
 
-        obj = response_json["imdata"][0]["pcAggrIf"]
+    if item["type"] == "standalone":
+        tdn = "topology/pod-1/paths-" + node + "/pathep-[" + item["interface"] + "]"
+    elif item["type"] == "port-channel":
+        tdn = "topology/pod-1/paths-" + node + "/pathep-[" + item["policy_group"] + "]"
+    else:
+        tdn = "topology/pod-1/protpaths-" + node + "-" + str(int(node) + 1) + "/pathep-[" + item["policy_group"] + "]"
 
-        if any("children" in d for d in obj):
-            child_obj = response_json["imdata"][0]["pcAggrIf"]["children"][0]["pconsCtrlrDeployCtx"]["children"]
-        else: 
-            print("No EPGs detected on node " + node + " interface " + intf)
-            return
+    list1 = index["epg"].get(tdn, [])
 
-        list1 = []
-        for dic in child_obj:
-            for val in dic.values():
-                if not isinstance(val, dict):
-                    print(val)
-            else:
-                for val2 in val.values():
-                    list1.append(val2["ctxDn"])
+    #checks if any epgs exist
+    if list1 == []:
+        log("No EPGs detected on node " + node + " interface " + item["interface"])
+        return
 
-        item["epg"] = list1
-        return item
+    item["epg"] = list1
+    return item
 
 
 '''
 This function will remove any down interfaces from the EPGs
 '''
 def remove_port(epg):
-    global token, timer
-
     #loops through epgs
     for item in epg["epg"]:
 
@@ -544,87 +436,180 @@ def remove_port(epg):
             paths = "protpaths-"
             interface = epg["policy_group"]
 
-        c_timer = time.time()
-        d_timer = c_timer - timer
-        if d_timer >= 540:
-            token = get_token.refresh_token(fabric, token)
-            timer = time.time()
-
         url = fabric + "/api/node/mo/" + item + "/rspathAtt-[topology/pod-1/" + paths + node + "/pathep-[" + interface + "]].json"
 
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-
         payload = {"fvRsPathAtt":{"attributes":{"dn": item + "/rspathAtt-[topology/pod-1/"  + paths + node + "/pathep-[" + interface + "]]","status":"deleted"},"children":[]}}
 
         data = json.dumps(payload)
-        requests.packages.urllib3.disable_warnings()
-        response = requests.post(url, data=data, headers=headers, verify=False)
+        response = apic_client.post(url, data=data)
 
         #If not status code 200, skip request
         if response.status_code != 200:
-            print("ERROR! Could not remove port " + epg["policy_group"] + " on node " + node + " from epg " + item)
+            fail("ERROR! Could not remove port " + interface + " on node " + node + " from epg " + item)
             continue
 
-        response_json = json.loads(response.text)
-
         if response.status_code == 200:
-            print("Node " + node + " Interface " + interface + " removed from " + item)
+            log("Node " + node + " Interface " + interface + " removed from " + item)
 
 
-def main():
-    global token, timer
-    snapshot.snapshot_pre(change, token, fabric)
-
-    #Gets all F0532 faults > 30 days
-    fault = get_f0532()
-
-    counter = 0
-    #Loops through faults
-    for item in fault["imdata"]:
+'''
+This function resolves every fault to its logical interface (standalone, port-channel or vpc pair) in one pass over the
+fault list. Faults on the same logical interface are grouped so each interface is only processed once.
+Returns a list of {"interface": interface, "faults": [fault dn, ...]} in the order the interfaces were first seen,
+and the set of fault dns that could not be resolved because of an error.
+'''
+def group_faults(faults):
 
-        #calls function to split into physical, port channel or vpc group
+    groups = {}
+    failed = set()
+    for item in faults:
+        output.failed = False
         interface = split_int(item)
 
+        if output.failed == True:
+            failed.add(item["faultInst"]["attributes"]["dn"])
+
         if interface == None:
             continue
-        elif interface["type"] == "standalone":
-            counter += 1
-            print("-----Request: " + str(counter) + "-----")
-            print("Processing fault F0532: " + item["faultInst"]["attributes"]["dn"])
-            print("Standalone interface " + interface["interface"] + " on node " + interface["node"])
-        elif interface["type"] == "port-channel":
-            counter += 1
-            print("-----Request: " + str(counter) + "-----")
-            print("Processing fault F0532: " + item["faultInst"]["attributes"]["dn"])
-            print("Port-channel interface " + interface["policy_group"] + " on node " + interface["node"])
-        elif interface["type"] == "VPC":
-            counter += 1
-            print("-----Request: " + str(counter) + "-----")
-            print("Processing fault F0532: " + item["faultInst"]["attributes"]["dn"])
-            print("VPC interface " + interface["policy_group"] + " on node " + interface["node"] + "-" + str(int(interface["node"]) + 1))
 
-        status = int_status(interface)
+        key = (interface["type"], interface["node"], interface["interface"])
+        if key not in groups:
+            groups[key] = {"interface": interface, "faults": []}
+        groups[key]["faults"].append(item["faultInst"]["attributes"]["dn"])
 
-        if status == None:
-            print("")
-            continue
+    return(list(groups.values()), failed)
 
-        epg = get_epg(status)
 
-        if epg == None:
-            print("")
-            continue
+'''
+Stage 1. Works out the state and EPGs for a logical interface. Returns (epg, lines). Sets group["failed"] if there was an error.
+'''
+def evaluate_fault(group):
+    output.lines = []
+    output.failed = False
+
+    interface = group["interface"]
+
+    for dn in group["faults"]:
+        log("Processing fault F0532: " + dn)
+    if interface["type"] == "standalone":
+        log("Standalone interface " + interface["interface"] + " on node " + interface["node"])
+    elif interface["type"] == "port-channel":
+        log("Port-channel interface " + interface["policy_group"] + " on node " + interface["node"])
+    elif interface["type"] == "VPC":
+        log("VPC interface " + interface["policy_group"] + " on node " + interface["node"] + "-" + str(int(interface["node"]) + 1))
+
+    status = int_status(interface)
+
+    group["failed"] = output.failed
+
+    if status == None:
+        return(None, output.lines)
+
+    epg = get_epg(status)
+
+    if epg != None:
+        log("Number of EPGs on interface : " + str(len(epg["epg"])))
+
+    return(epg, output.lines)
+
+
+'''
+Stage 2. Removes the static ports for a fault and adds the output to the lines from stage 1.
+'''
+def remove_fault(group, epg, lines):
+    output.lines = lines
+    output.failed = group["failed"]
+
+    remove_port(epg)
+
+    group["failed"] = output.failed
+
+    return(output.lines)
+
+
+'''
+This function moves the watermark up to start_date, or back to the oldest fault that failed, records the faults that
+were processed and saves the state
+'''
+def update_state(state, start_date, faults, failed):
+
+    state["watermark"] = str(start_date)
+    for item in faults:
+        attributes = item["faultInst"]["attributes"]
+        if attributes["dn"] in failed:
+            state["watermark"] = min(state["watermark"], attributes["lastTransition"])
+            state["processed"].pop(attributes["dn"], None)
         else:
-            print("Number of EPGs on interface : " + str(len(epg["epg"])))
-            delete_stat = remove_port(epg)
-            if delete_stat == None:
-                print("")
-                continue
-        print("")
-        time.sleep(2)
+            state["processed"][attributes["dn"]] = attributes["lastTransition"]
+
+    save_state(state)
+
+
+'''
+This function prints and logs the output of a fault
+'''
+def report(lines):
+    for line in lines + [""]:
+        print(line)
+        logger.info(line)
+
+
+def main():
+    snapshot.snapshot_pre(change, token, fabric)
+
+    #Creates variable for X number of days before current date
+    start_date = datetime.date.today() - datetime.timedelta(30)
+
+    #Gets all F0532 faults > 30 days, or only the new ones since the last run
+    state = load_state()
+    fault = get_f0532(start_date, state, args.full_rescan)
+
+    #nothing new since the last run, moves the watermark forward without pulling the fabric state
+    if fault["imdata"] == []:
+        update_state(state, start_date, [], set())
+        snapshot.snapshot_post(change, token, fabric)
+        return
+
+    #Pulls interface, port-channel, vpc and static path state for the nodes with faults
+    prefetch(fault_nodes(fault["imdata"]))
+
+    #limits the requests sent to the APIC instead of sleeping after every fault
+    apic_client.set_rate_limit(RATE_LIMIT)
+
+    #groups faults on the same port-channel or vpc so each interface is processed once
+    groups, failed = group_faults(fault["imdata"])
+    print(str(len(groups)) + " interfaces to process.\n")
+
+    with ThreadPoolExecutor(max_workers=EVALUATE_WORKERS) as evaluate_pool, ThreadPoolExecutor(max_workers=REMOVE_WORKERS) as remove_pool:
+
+        evaluations = [evaluate_pool.submit(evaluate_fault, group) for group in groups]
+
+        #hands each evaluated interface to the remove stage in order
+        results = []
+        for group, future in zip(groups, evaluations):
+            epg, lines = future.result()
+            if epg != None:
+                results.append(remove_pool.submit(remove_fault, group, epg, lines))
+            else:
+                results.append(lines)
+
+        #prints the output in order as each interface finishes
+        counter = 0
+        for lines in results:
+            if not isinstance(lines, list):
+                lines = lines.result()
+            counter += 1
+            report(["-----Request: " + str(counter) + "-----"] + lines)
+
+    for group in groups:
+        if group["failed"] == True:
+            failed.update(group["faults"])
+
+    #saves the watermark so the next run only looks at new, changed or failed faults
+    update_state(state, start_date, fault["imdata"], failed)
 
+    if failed != set():
+        print(str(len(failed)) + " F0532 faults had errors and will be checked again next run.")
 
     snapshot.snapshot_post(change, token, fabric)
 
@@ -14,49 +14,39 @@
 '''
 
 import snapshot
-import get_token
+import apic_client
+import apic_query
 import json
-import requests
+import sys
 
 #Logs into fabric and saves token, url and change number
-login = get_token.get_token()
+login = apic_client.login()
 token = login[0]
 fabric = login[1]
 change = login[2]
 
+#applies storm control with chunked infraFuncP payloads instead of one request per policy group
+BULK_APPLY = True
+
 
 def main():
 
     policy_group = []
 
     #gets access policy_groups
-    url = fabric + "/api/node/class/infraAccPortGrp.json"          
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
-    requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
-    response_json = json.loads(response.text)
-
-    child_obj = response_json["imdata"]
-
-    for item in child_obj:
+    url = apic_query.class_url(fabric, "infraAccPortGrp", props="naming-only")
+    for item in apic_client.iter_objects(url):
+        if item == None:
+            sys.exit("ERROR! Could not retrieve access policy groups.")
         group = item["infraAccPortGrp"]["attributes"]["name"]
 
         policy_group.append({'lag_type': 'leaf', 'policy_group': group})   
         
     #gets po and vpc policy_groups
-    url = fabric + "/api/node/class/infraAccBndlGrp.json"          
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
-    requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
-    response_json = json.loads(response.text)
-
-    child_obj = response_json["imdata"]
-
-    for item in child_obj:
+    url = apic_query.class_url(fabric, "infraAccBndlGrp", props="config-only")
+    for item in apic_client.iter_objects(url):
+        if item == None:
+            sys.exit("ERROR! Could not retrieve po and vpc policy groups.")
         group = item["infraAccBndlGrp"]["attributes"]["name"]
         type = item["infraAccBndlGrp"]["attributes"]["lagT"]
 
@@ -65,27 +55,26 @@ def main():
 
     #print(policy_group)
 
+    storm_policy = "SVS_Recommended"
+
+    #gets every storm control relation in one query and drops policy groups that already use storm_policy
+    compliant = get_storm_policy(storm_policy)
+    policy_group = [item for item in policy_group if (class_prefix(item) + item["policy_group"]) not in compliant]
+    print(str(len(compliant)) + " policy groups already use " + storm_policy + ". " + str(len(policy_group)) + " to update.")
+
+    if BULK_APPLY == True:
+        apply_bulk(policy_group, storm_policy)
+        return
+
     #apply storm control to all access policy groups
     for item in policy_group:
-        
-        if item["lag_type"] == "leaf":
-            class_type = "accportgrp"
-        else:
-            class_type = "accbundle"
 
-        storm_policy = "SVS_Recommended"
-
-        url = fabric + "/api/node/mo/uni/infra/funcprof/" + class_type + "-" + item["policy_group"] + "/rsstormctrlIfPol.json"          
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
+        url = fabric + "/api/node/mo/uni/infra/funcprof/" + class_prefix(item) + item["policy_group"] + "/rsstormctrlIfPol.json"          
 
         payload = {"infraRsStormctrlIfPol":{"attributes":{"tnStormctrlIfPolName":storm_policy},"children":[]}}
         data = json.dumps(payload)
 
-        requests.packages.urllib3.disable_warnings()
-        response = requests.post(url, data=data, headers=headers, verify=False)
-        response_json = json.loads(response.text)
+        response = apic_client.post(url, data=data)
 
         if response.status_code != 200:
             print("ERROR! Could not deploy policy on " + item["policy_group"] + " " + str(response))
@@ -93,5 +82,59 @@ def main():
             print(storm_policy + " deployed on policy group: " + item["policy_group"])
 
 
+'''
+This function returns the funcprof rn prefix for a policy group (accportgrp- for access, accbundle- for po and vpc)
+'''
+def class_prefix(item):
+    if item["lag_type"] == "leaf":
+        return("accportgrp-")
+    else:
+        return("accbundle-")
+
+
+'''
+This function returns the set of policy group rns (ex. accportgrp-NAME) that already use storm_policy. Only the relations
+that point at storm_policy are returned by the APIC.
+'''
+def get_storm_policy(storm_policy):
+
+    url = apic_query.class_url(fabric, "infraRsStormctrlIfPol", filter=apic_query.eq("infraRsStormctrlIfPol.tnStormctrlIfPolName", storm_policy))
+
+    compliant = set()
+    for item in apic_client.iter_objects(url):
+        if item == None:
+            print("ERROR! Could not retrieve storm control relations, applying to all policy groups.")
+            return(set())
+        compliant.add(item["infraRsStormctrlIfPol"]["attributes"]["dn"].split("/")[3])
+
+    return(compliant)
+
+
+'''
+This function applies storm_policy to all policy groups with chunked infraFuncP payloads
+'''
+def apply_bulk(policy_group, storm_policy):
+
+    url = fabric + "/api/node/mo/uni/infra/funcprof.json"
+
+    children = []
+    for item in policy_group:
+        if item["lag_type"] == "leaf":
+            group_class = "infraAccPortGrp"
+        else:
+            group_class = "infraAccBndlGrp"
+
+        children.append({group_class:{"attributes":{"dn":"uni/infra/funcprof/" + class_prefix(item) + item["policy_group"]},"children":[{"infraRsStormctrlIfPol":{"attributes":{"tnStormctrlIfPolName":storm_policy},"children":[]}}]}})
+
+    results = apic_client.post_bulk(url, "infraFuncP", {"dn": "uni/infra/funcprof"}, children)
+
+    for chunk, response in results:
+        for child in chunk:
+            name = list(child.values())[0]["attributes"]["dn"].split("-", 1)[1]
+            if response.status_code != 200:
+                print("ERROR! Could not deploy policy on " + name + " " + str(response))
+            else:
+                print(storm_policy + " deployed on policy group: " + name)
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -17,12 +17,13 @@ import json
 import sys
 from getpass import getpass
 import argparse
+import os
 
 
 '''
 This function takes the name/pwd input to log into the APIC and stores the token as a variable
 '''
-def get_token():
+def get_token(session=None):
 
 
     #takes fabric argument and store the corresponding url
@@ -31,10 +32,11 @@ def get_token():
     parser.add_argument("--user", dest="name", metavar='', type=str, help='Enter username within sinle quotes')
     parser.add_argument("--pass", dest="pwd", metavar='', type=str, help='Enter password within single quotes')
     parser.add_argument("--chg", dest="chg", metavar='', type=str, help='Enter change number:')
-    args = parser.parse_args()
+    args = parser.parse_known_args()[0]
     site = args.fabric
     name = args.name
-    pwd = args.pwd
+    #multi_fabric.py passes the password in the environment so it isn't visible in the process list
+    pwd = args.pwd or os.environ.get("APIC_PASS")
     change = str(args.chg)
     fabric = ""
 
@@ -109,8 +111,12 @@ def get_token():
 
     data = json.dumps(payload)
 
+    #uses the shared apic_client session if one is passed in
+    if session == None:
+        session = requests
+
     requests.packages.urllib3.disable_warnings()
-    response = requests.post(url,data=data, verify=False)
+    response = session.post(url,data=data, verify=False)
 
     if response.status_code == 401:
         sys.exit("TACACS+ Server Authentication DENIED")
@@ -126,15 +132,18 @@ def get_token():
 
 
 
-def refresh_token(fabric, token):
+def refresh_token(fabric, token, session=None):
     url = fabric + "/api/aaaRefresh.json"
 
     headers = {
         "Cookie" : f"APIC-Cookie={token}", 
     }
 
+    if session == None:
+        session = requests
+
     requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
+    response = session.get(url, headers=headers, verify=False)
     response_json = json.loads(response.text)
 
     token2 = response_json["imdata"][0]["aaaLogin"]["attributes"]["token"]
@@ -14,26 +14,25 @@
 '''
 
 import snapshot
-import get_token
+import apic_client
+import apic_query
 import logging
 from logging.handlers import RotatingFileHandler
 import json
-import requests
 import sys
 import re
-import time
-import socket
+import os
+import resolver
 
 #Logs into fabric and saves token, url and change number
-login = get_token.get_token()
+login = apic_client.login()
 token = login[0]
 fabric = login[1]
 change = login[2]
 
-timer = time.time()
-
 #Logs to file
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s.%(msecs)03d] [%(levelname)s] [%(filename)s] [%(funcName)s():%(lineno)s] %(message)s', handlers=[RotatingFileHandler('logs/int_desc.log', maxBytes=1000000, backupCount=1)])
+os.makedirs("logs", exist_ok=True)
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s.%(msecs)03d] [%(levelname)s] [%(filename)s] [%(funcName)s():%(lineno)s] %(message)s', handlers=[RotatingFileHandler('logs/int_desc_' + apic_client.fabric_name() + '.log', maxBytes=1000000, backupCount=1)])
 
 #logs to console
 console = logging.StreamHandler()
@@ -41,40 +40,28 @@ console.setLevel(logging.WARNING)
 logging.getLogger('').addHandler(console)
 logger = logging.getLogger(__name__)
 
+#pulls LLDP neighbours for the whole fabric in one paginated class query instead of one query per node
+LLDP_BULK = True
 
-def main():
-    global token, timer
-
-    #takes pre-snapshot
-    snapshot.snapshot_pre(change, token, fabric)
-
-    c_timer = time.time()
-    d_timer = c_timer - timer
-    if d_timer >= 600:
-        token = get_token.get_token()
-        token = token[0]
-        timer = time.time()
-    if d_timer >= 540:
-        token = get_token.refresh_token(fabric, token)
-        timer = time.time()
+#posts the interface descriptions in batches under uni/infra instead of one request per interface
+BATCH_WRITES = True
 
-    url = fabric + "/api/node/class/fabricNode.json"
 
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
+'''
+This function returns the active leaf and spine switches as {nodeid: {"pod": podid, "role": role}}
+'''
+def get_nodes():
 
-    requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
+    #only active leaf and spine switches are returned
+    url = apic_query.class_url(fabric, "fabricNode", filter=apic_query.and_(apic_query.eq("fabricNode.fabricSt", "active"), apic_query.or_(apic_query.eq("fabricNode.role", "leaf"), apic_query.eq("fabricNode.role", "spine"))))
 
-    if response.status_code != 200:
-        logger.error("ERROR! Could not retrieve switch IDs.")
-        logger.debug(response)
-        sys.exit()
+    nodes = {}
+    for item in apic_client.iter_objects(url):
 
-    response_json = json.loads(response.text)
+        if item == None:
+            logger.error("ERROR! Could not retrieve switch IDs.")
+            sys.exit()
 
-    for item in response_json["imdata"]:
         if item["fabricNode"]["attributes"]["fabricSt"] != "active":
             continue
         elif item["fabricNode"]["attributes"]["role"] != "leaf" and item["fabricNode"]["attributes"]["role"] != "spine":
@@ -83,45 +70,166 @@ def main():
             reg = re.findall('(?<=pod-).*$', item["fabricNode"]["attributes"]["dn"])[0]
             podid = str(reg).split("/")[0]
             nodeid = re.findall('(?<=node-).*$', item["fabricNode"]["attributes"]["dn"])[0]
-        
-        role = item["fabricNode"]["attributes"]["role"]
-
-        c_timer = time.time()
-        d_timer = c_timer - timer
-        if d_timer >= 600:
-            token = get_token.get_token()
-            token = token[0]
-            timer = time.time()
-        if d_timer >= 540:
-            token = get_token.refresh_token(fabric, token)
-            timer = time.time()
-
-        url = fabric + "/api/node/class/topology/pod-" + podid + "/node-" + nodeid + "/lldpIf.json?rsp-subtree=children&rsp-subtree-class=lldpIf,lldpAdjEp&rsp-subtree-include=required"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
 
+        nodes[nodeid] = {"pod": podid, "role": item["fabricNode"]["attributes"]["role"]}
+
+    return(nodes)
+
+
+'''
+This function pulls every lldpIf with an lldpAdjEp child across the fabric in one paginated class query
+and groups them by node id. Returns {nodeid: [lldpIf, ...]}
+'''
+def get_lldp_bulk():
+
+    url = apic_query.class_url(fabric, "lldpIf", subtree="children", subtree_class="lldpAdjEp", subtree_include="required")
+
+    imdata = apic_client.get_pages(url)
+
+    if imdata == None:
+        logger.error("ERROR! Could not retrieve LLDP neighbours.")
+        sys.exit()
+
+    lldp = {}
+    for item in imdata:
+        nodeid = re.findall(r'(?<=node-)\d+', item["lldpIf"]["attributes"]["dn"])[0]
+        lldp.setdefault(nodeid, []).append(item)
+
+    return(lldp)
+
+
+'''
+This function gets the LLDP neighbours for a single node. Used when LLDP_BULK is False.
+'''
+def get_lldp_node(podid, nodeid):
+
+    url = apic_query.class_url(fabric, "lldpIf", scope="topology/pod-" + podid + "/node-" + nodeid, subtree="children", subtree_class=["lldpIf", "lldpAdjEp"], subtree_include="required")
+
+    response = apic_client.get(url)
+
+    if response.status_code != 200:
+        logger.error("ERROR! Could not retrieve LLDP neighbours for node " + nodeid + ".")
+        logger.debug(response)
+        return([])
+
+    response_json = apic_client.loads(response.content)
+
+    return(response_json["imdata"])
+
+
+'''
+This function checks if the LLDP neighbour is a device we add descriptions for (Palo Alto, NX-OS or node)
+'''
+def is_match(sysdesc):
+    return("palo" in sysdesc.lower() or "nx-os" in sysdesc.lower() or "node" in sysdesc.lower())
+
+
+'''
+This function resolves the management ip of every matching neighbour in one parallel, cached pass
+'''
+def resolve_neighbours(lldp):
+
+    ips = []
+    for neighbours in lldp.values():
+        for item in neighbours:
+            adj = item["lldpIf"]["children"][0]["lldpAdjEp"]["attributes"]
+            if is_match(adj["sysDesc"]) and adj["mgmtIp"] != "unspecified":
+                ips.append(adj["mgmtIp"])
+
+    resolver.load()
+    hostnames = resolver.resolve_all(ips)
+    resolver.save()
+
+    return(hostnames)
+
+
+'''
+This function pulls every existing infraHPathS and infraSHPathS with its path relation in one query and
+returns {(nodeid, interface): descr} so unchanged descriptions can be skipped
+'''
+def get_descriptions():
+
+    url = apic_query.mo_url(fabric, "uni/infra", target="children", target_class=["infraHPathS", "infraSHPathS"], subtree="children", subtree_class=["infraRsHPathAtt", "infraRsSHPathAtt"], props="config-only")
+
+    imdata = apic_client.get_pages(url)
+
+    if imdata == None:
+        logger.error("ERROR! Could not retrieve existing interface descriptions, every interface will be written.")
+        return({})
+
+    descriptions = {}
+    for item in imdata:
+        for obj in item.values():
+            for child in obj.get("children", []):
+                for rel in child.values():
+                    tdn = rel["attributes"]["tDn"]
+                    nodeid = re.findall(r'(?<=paths-)\d+', tdn)
+                    interface = re.findall(r'(?<=pathep-\[).+(?=\])', tdn)
+                    if nodeid != [] and interface != []:
+                        descriptions[(nodeid[0], interface[0])] = obj["attributes"]["descr"]
+
+    return(descriptions)
+
+
+'''
+This function posts all pending interface descriptions under infraInfra in size bounded batches, then reads the
+descriptions back to report which interfaces were updated
+'''
+def post_descriptions(pending):
+
+    url = fabric + "/api/node/mo/uni/infra.json"
+
+    results = apic_client.post_bulk(url, "infraInfra", {"dn": "uni/infra"}, [item["payload"] for item in pending])
+
+    for chunk, response in results:
         if response.status_code != 200:
-            logger.error("ERROR! Could not retrieve LLDP neighbours for node " + nodeid + ".")
+            logger.error("ERROR! Could not add a batch of " + str(len(chunk)) + " interface descriptions.")
             logger.debug(response)
-            continue
+        else:
+            logger.debug(apic_client.loads(response.content))
+
+    descriptions = get_descriptions()
+
+    for item in pending:
+        if descriptions.get((item["node"], item["interface"])) == item["descr"]:
+            print("Successfully added description " + item["descr"] + " to node " + item["node"] + " interface " + item["interface"])
+        else:
+            logger.error("ERROR! Could not add interface description for node " + item["node"] + " interface " + item["interface"] + ".")
+
+
+def main():
+    #takes pre-snapshot
+    snapshot.snapshot_pre(change, token, fabric)
+
+    nodes = get_nodes()
 
-        response_json = json.loads(response.text)
+    if LLDP_BULK == True:
+        lldp = get_lldp_bulk()
+    else:
+        lldp = {}
+        for nodeid in nodes:
+            lldp[nodeid] = get_lldp_node(nodes[nodeid]["pod"], nodeid)
 
-        for item in response_json["imdata"]:
+    hostnames = resolve_neighbours(lldp)
+
+    descriptions = get_descriptions()
+    skipped = 0
+    pending = []
+
+    for nodeid in nodes:
+        podid = nodes[nodeid]["pod"]
+        role = nodes[nodeid]["role"]
+
+        for item in lldp.get(nodeid, []):
             interface = item["lldpIf"]["attributes"]["id"]
             sysname = item["lldpIf"]["children"][0]["lldpAdjEp"]["attributes"]["sysName"]
             mgmtip = item["lldpIf"]["children"][0]["lldpAdjEp"]["attributes"]["mgmtIp"]
             sysdesc = item["lldpIf"]["children"][0]["lldpAdjEp"]["attributes"]["sysDesc"]
 
-            if "palo" in sysdesc.lower() or "nx-os" in sysdesc.lower() or "node" in sysdesc.lower():
+            if is_match(sysdesc):
                 if mgmtip != "unspecified":
-                    try:
-                        hostname = socket.gethostbyaddr(mgmtip)[0]
-                    except socket.herror:
+                    hostname = hostnames.get(mgmtip)
+                    if hostname == None:
                         if sysname != "":
                             hostname = sysname
                         else:
@@ -133,16 +241,6 @@ def main():
 
                 ether = interface.replace("/", "_")
 
-                c_timer = time.time()
-                d_timer = c_timer - timer
-                if d_timer >= 600:
-                    token = get_token.get_token()
-                    token = token[0]
-                    timer = time.time()
-                if d_timer >= 540:
-                    token = get_token.refresh_token(fabric, token)
-                    timer = time.time()
-
                 if role == "leaf":
                     infrapath = "infraHPathS"
                     hpath = "hpaths-"
@@ -155,17 +253,22 @@ def main():
                     rpath = "rsSHPathAtt"
 
                 url = fabric + "/api/node/mo/uni/infra/" + hpath + nodeid + "_" + ether + ".json"
-                headers = {
-                    "Cookie" : f"APIC-Cookie={token}", 
-                }
 
                 hostname = "* VRT * " + hostname
 
+                #skips the write if the description is already set
+                if descriptions.get((nodeid, interface)) == hostname:
+                    skipped += 1
+                    continue
+
                 payload = {infrapath:{"attributes":{"rn":hpath + nodeid + "_" + ether ,"dn":"uni/infra/" + hpath + nodeid + "_" + ether ,"descr": hostname ,"name": nodeid + "_" + ether},"children":[{infrarpath:{"attributes":{"dn":"uni/infra/" + hpath + nodeid + "_" + ether + "/" + rpath + "-[topology/pod-" + podid + "/paths-" + nodeid + "/pathep-[" + interface + "]]","tDn":"topology/pod-" + podid + "/paths-" + nodeid + "/pathep-[" + interface + "]"}}}]}}
 
+                if BATCH_WRITES == True:
+                    pending.append({"node": nodeid, "interface": interface, "descr": hostname, "payload": payload})
+                    continue
+
                 data = json.dumps(payload)
-                requests.packages.urllib3.disable_warnings()
-                response = requests.post(url, data=data, headers=headers, verify=False)
+                response = apic_client.post(url, data=data)
 
                 if response.status_code != 200:
                     logger.error("ERROR! Could not add interface description for node " + nodeid + " interface " + interface + ".")
@@ -173,9 +276,14 @@ def main():
                     continue
                 else:
                     print("Successfully added description " + hostname + " to node " + nodeid + " interface " + interface)
-                    response_json = json.loads(response.text)
+                    response_json = apic_client.loads(response.content)
                     logger.debug(response_json)
 
+    if pending != []:
+        post_descriptions(pending)
+
+    print(str(skipped) + " interface descriptions were already up to date.")
+
     snapshot.snapshot_post(change, token, fabric)
     sys.exit()
 
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+'''
+   On-disk cache of class query results shared between script runs (ex. int_desc, clean_f0532 and modify_ports run
+   back to back in one change window). Results are stored in an SQLite file keyed by the full query url, so each
+   fabric and each filter has its own entry. Only the classes in CLASSES are cached, each with its own TTL.
+
+   Entries are removed when:
+       1. their TTL runs out
+       2. the file grows past MAX_BYTES (least recently used first)
+       3. a script posts under the DN prefix listed for the class (see apic_client.post)
+
+   Add --no-cache to any script to skip the cache, or --refresh to ignore what is stored and save fresh results.
+
+
+    File name: mo_cache.py
+    Author: Nicholas Bogdajewicz
+    Date created: 10/18/2026
+    Date last modified: 10/18/2026
+    Python Version: 3.8.2
+'''
+
+import threading
+import argparse
+import sqlite3
+import json
+import time
+import os
+import re
+
+CACHE_FILE = "cache/mo_cache.db"
+MAX_BYTES = 200000000
+
+#class: (ttl in seconds, DN prefix whose writes make the cached results stale)
+CLASSES = {
+    "fabricNode": (3600, "topology"),
+    "infraAccPortGrp": (900, "uni/infra"),
+    "infraAccBndlGrp": (900, "uni/infra"),
+    "infraRsStormctrlIfPol": (900, "uni/infra"),
+    "pcRsMbrIfs": (900, "uni/infra"),
+    "pcRtAccBndlGrpToAggrIf": (900, "uni/infra"),
+    "pcRtVpcConf": (900, "uni/infra"),
+    "vpcRsVpcConf": (900, "uni/infra"),
+    "fvRsPathAtt": (300, "uni/tn-"),
+    "fvIfConn": (300, "uni/tn-"),
+}
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--no-cache", dest="no_cache", action="store_true", help='Do not read or write the MO cache')
+parser.add_argument("--refresh", dest="refresh", action="store_true", help='Ignore cached results and save fresh ones')
+args = parser.parse_known_args()[0]
+
+ENABLED = args.no_cache == False
+REFRESH = args.refresh
+
+db = None
+db_lock = threading.Lock()
+
+
+'''
+This function opens the cache file the first time it is needed
+'''
+def connect(path=CACHE_FILE):
+    global db
+
+    if db == None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        db.execute("CREATE TABLE IF NOT EXISTS mo (url TEXT PRIMARY KEY, fabric TEXT, prefix TEXT, data BLOB, size INTEGER, expires REAL, used REAL)")
+        db.execute("CREATE INDEX IF NOT EXISTS mo_used ON mo (used)")
+        db.commit()
+
+    return(db)
+
+
+'''
+This function returns the class of a class query url, or None if the url is not a class query for a cached class
+'''
+def class_of(url):
+
+    cls = re.findall(r'/class/(?:.+/)?(\w+)\.json', url)
+    if cls == [] or cls[0] not in CLASSES:
+        return
+
+    return(cls[0])
+
+
+'''
+This function returns the cached imdata for url, or None if it is not cached, expired or the cache is off
+'''
+def lookup(url):
+
+    if ENABLED == False or REFRESH == True or class_of(url) == None:
+        return
+
+    now = time.time()
+    with db_lock:
+        cur = connect().execute("SELECT data, expires FROM mo WHERE url = ?", (url,))
+        row = cur.fetchone()
+        if row == None:
+            return
+        if row[1] <= now:
+            db.execute("DELETE FROM mo WHERE url = ?", (url,))
+            db.commit()
+            return
+        db.execute("UPDATE mo SET used = ? WHERE url = ?", (now, url))
+        db.commit()
+
+    return(json.loads(row[0]))
+
+
+def store(url, imdata):
+
+    cls = class_of(url)
+    if ENABLED == False or cls == None:
+        return
+
+    ttl, prefix = CLASSES[cls]
+    data = json.dumps(imdata)
+    now = time.time()
+    fabric = re.findall(r'^https?://[^/]+', url)[0]
+
+    with db_lock:
+        connect().execute("INSERT OR REPLACE INTO mo VALUES (?, ?, ?, ?, ?, ?, ?)", (url, fabric, prefix, data, len(data), now + ttl, now))
+        db.commit()
+
+    evict()
+
+
+'''
+This function drops expired entries, then the least recently used entries until the cache is under MAX_BYTES
+'''
+def evict(max_bytes=None):
+
+    if max_bytes == None:
+        max_bytes = MAX_BYTES
+
+    with db_lock:
+        conn = connect()
+        conn.execute("DELETE FROM mo WHERE expires <= ?", (time.time(),))
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM mo").fetchone()[0]
+        if total > max_bytes:
+            for url, size in conn.execute("SELECT url, size FROM mo ORDER BY used").fetchall():
+                conn.execute("DELETE FROM mo WHERE url = ?", (url,))
+                total -= size
+                if total <= max_bytes:
+                    break
+
+        conn.commit()
+
+
+'''
+This function removes the entries of a fabric that a write to dn could have changed. With no dn every entry
+for the fabric is removed.
+'''
+def invalidate(fabric, dn=None):
+
+    if ENABLED == False:
+        return
+
+    with db_lock:
+        conn = connect()
+        if dn == None:
+            conn.execute("DELETE FROM mo WHERE fabric = ?", (fabric,))
+        else:
+            for url, prefix in conn.execute("SELECT url, prefix FROM mo WHERE fabric = ?", (fabric,)).fetchall():
+                if dn.startswith(prefix) or prefix.startswith(dn):
+                    conn.execute("DELETE FROM mo WHERE url = ?", (url,))
+        conn.commit()
+
+
+def clear():
+
+    with db_lock:
+        connect().execute("DELETE FROM mo")
+        db.commit()
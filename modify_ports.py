@@ -14,22 +14,29 @@
 '''
 
 import snapshot
-import get_token
+import apic_client
+import apic_query
 import logging
 from logging.handlers import RotatingFileHandler
 import json
-import requests
 import sys
 import re
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 #Logs into fabric and saves token, url and change number
-login = get_token.get_token()
+login = apic_client.login()
 token = login[0]
 fabric = login[1]
 change = login[2]
 
-timer = time.time()
+#number of vlans per fvIfConn query when building the vlan to epg index
+VLAN_CHUNK = 50
+
+#queues new static paths and posts them per tenant in size bounded fvTenant payloads instead of one request per vlan
+BULK_DEPLOY = True
+
+#number of tenants posted to at the same time by bulk deploys and decoms
+TENANT_WORKERS = 4
 
 '''
 #Logs to file
@@ -42,6 +49,81 @@ logging.getLogger('').addHandler(console)
 logger = logging.getLogger(__name__)
 '''
 
+#gets the interface selectors of a leaf interface profile as {selector dn: [{"dn", "name", "fromPort", "toPort"}, ...]}
+def get_selector_blocks(profile):
+    url = apic_query.mo_url(fabric, "uni/infra/accportprof-" + profile, target="children", target_class="infraHPortS", subtree="children", subtree_class="infraPortBlk", props="config-only")
+
+    response = apic_client.get(url)
+
+    #checks if successful response
+    if response.status_code != 200:
+        print("ERROR! could not verify which ports are in " + profile + ".")
+        return
+
+    response_json = apic_client.loads(response.content)
+
+    selectors = {}
+    for item in response_json["imdata"]:
+        blocks = selectors.setdefault(item["infraHPortS"]["attributes"]["dn"], [])
+        for child in item["infraHPortS"].get("children", []):
+            block = child["infraPortBlk"]["attributes"]
+            blocks.append({"dn": block["dn"], "name": block["name"], "fromPort": int(block["fromPort"]), "toPort": int(block["toPort"])})
+
+    return(selectors)
+
+
+#gets the ports already covered by interface selectors in a leaf interface profile as a set of port numbers
+def get_selectors(profile):
+    selectors = get_selector_blocks(profile)
+    if selectors == None:
+        return
+
+    ports = set()
+    for blocks in selectors.values():
+        for block in blocks:
+            ports.update(range(block["fromPort"], block["toPort"] + 1))
+
+    return(ports)
+
+
+#works out the policy group for a port, returns None if it can't be detected
+def get_policy_group(details, port):
+    if details["type"] == "access":
+        if details["speed"] == "100m":
+            return("AccessPort_100Mbps_Auto")
+        elif details["speed"] == "1g":
+            return("AccessPort_1Gbps_Auto")
+        elif details["speed"] == "10g":
+            return("AccessPort_10Gbps_Auto")
+        elif details["speed"] == "25g":
+            return("AccessPort_25Gbps_Auto")
+    else:
+        if details["speed"] == "1g" and details["type"] == "vpc-lacp":
+            return("Port" + port + "_Intf_PolicyGrp-1Gbps-VPC")
+        elif details["speed"] == "10g" and details["type"] == "vpc-lacp":
+            return("Port" + port + "_Intf_PolicyGrp-VPC")
+        elif details["speed"] == "10g" and details["type"] == "vpc-macpinning":
+            return("Port" + port + "_Intf_PolicyGrp_MacPinning-10Gbps-VPC")
+        elif details["speed"] == "25g" and details["type"] == "vpc-lacp":
+            return("Port" + port + "_Intf_PolicyGrp_25Gbps-VPC")
+        elif details["speed"] == "25g" and details["type"] == "vpc-macpinning":
+            return("Port" + port + "_Intf_PolicyGrp_MacPinning-VPC")
+        elif details["speed"] == "40g" and details["type"] == "vpc-lacp":
+            return("Port" + port + "_Intf_PolicyGrp_40Gbps-VPC")
+    return
+
+
+#collapses contiguous ports that share a policy group into [(from port, to port, policy group), ...]
+def coalesce(ports):
+    ranges = []
+    for port, policy_group in sorted(ports, key=lambda p: int(p[0])):
+        if ranges != [] and int(ranges[-1][1]) + 1 == int(port) and ranges[-1][2] == policy_group:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port, policy_group])
+    return(ranges)
+
+
 #configures interface profile block
 def access_policy(details):
     node = details["node"]
@@ -59,154 +141,96 @@ def access_policy(details):
         details["even"] = node
         even = details["even"]
 
+    #gets the ports already in the odd, even and vpc profiles with one request per profile
+    odd_ports = get_selectors("LEAF" + odd + "_IntfProfile")
+    even_ports = get_selectors("LEAF" + even + "_IntfProfile")
+    vpc_ports = get_selectors("LEAF" + odd + "_LEAF" + even + "_IntfProfile")
+    if odd_ports == None or even_ports == None or vpc_ports == None:
+        return
+
+    new_ports = []
+    physical = {}
     for inter in interface:
         port = inter.replace('eth1/', '')
-        details["physical"] = inter
         if len(port) == 1:
             port = "0" + port
 
         #creates the policy group name
-        if details["type"] == "access":
-            if details["speed"] == "100m":
-                details["policy_group"] = "AccessPort_100Mbps_Auto"
-                policy_group = details["policy_group"]
-            elif details["speed"] == "1g":
-                details["policy_group"] = "AccessPort_1Gbps_Auto"
-                policy_group = details["policy_group"]
-            elif details["speed"] == "10g":
-                details["policy_group"] = "AccessPort_10Gbps_Auto"
-                policy_group = details["policy_group"]
-            elif details["speed"] == "25g":
-                details["policy_group"] = "AccessPort_25Gbps_Auto"
-                policy_group = details["policy_group"]
-            else:
-                print("Unable to detect policy group.")
-                continue
-        else:
-            if details["speed"] == "1g" and details["type"] == "vpc-lacp":
-                details["policy_group"] = "Port" + port + "_Intf_PolicyGrp-1Gbps-VPC"
-                policy_group = details["policy_group"]
-            elif details["speed"] == "10g" and details["type"] == "vpc-lacp":
-                details["policy_group"] = "Port" + port + "_Intf_PolicyGrp-VPC"
-                policy_group = details["policy_group"]
-            elif details["speed"] == "10g" and details["type"] == "vpc-macpinning":
-                details["policy_group"] = "Port" + port + "_Intf_PolicyGrp_MacPinning-10Gbps-VPC"
-                policy_group = details["policy_group"]
-            elif details["speed"] == "25g" and details["type"] == "vpc-lacp":
-                details["policy_group"] = "Port" + port + "_Intf_PolicyGrp_25Gbps-VPC"
-                policy_group = details["policy_group"]
-            elif details["speed"] == "25g" and details["type"] == "vpc-macpinning":
-                details["policy_group"] = "Port" + port + "_Intf_PolicyGrp_MacPinning-VPC"
-                policy_group = details["policy_group"]
-            elif details["speed"] == "40g" and details["type"] == "vpc-lacp":
-                details["policy_group"] = "Port" + port + "_Intf_PolicyGrp_40Gbps-VPC"
-                policy_group = details["policy_group"]
-            else:
-                print("Unable to detect policy group.")
-                continue
-
-        ##checks if interface selector exists in odd profile
-        url = fabric + "/api/node/mo/uni/infra/accportprof-LEAF" + odd + "_IntfProfile/hports-Port-" + port + "-typ-range.json"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
-
-        #checks if successful response
-        if response.status_code != 200:
-            print("ERROR! could not verify if port " + inter + " is in LEAF" + odd + "_IntfProfile.")
-
+        policy_group = get_policy_group(details, port)
+        if policy_group == None:
+            print("Unable to detect policy group.")
             continue
 
-        #logs if it exists
-        response_json = json.loads(response.text)
-        if details["type"] == "access" and int(node) % 2 != 0 and response_json["imdata"] != []:
+        ##checks if interface selector exists in odd profile
+        if details["type"] == "access" and int(node) % 2 != 0 and int(port) in odd_ports:
             print("\nInterface selector Port-" + port + " already exists in LEAF" + odd + "_IntfProfile")
+            details["physical"] = inter
+            details["policy_group"] = policy_group
             config_port(details)
             continue
-        elif details["type"] != "access" and response_json["imdata"] != []:
+        elif details["type"] != "access" and int(port) in odd_ports:
             print("\nInterface selector Port-" + port + " already exists in unexpected LEAF" + odd + "_IntfProfile")
             continue
-            
-        ##checks if interface seclector exists in even profile
-        url = fabric + "/api/node/mo/uni/infra/accportprof-LEAF" + even + "_IntfProfile/hports-Port-" + port + "-typ-range.json"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
-
-        #checks if successful response
-        if response.status_code != 200:
-            print("ERROR! could not verify if port " + inter + " is in LEAF" + even + "_IntfProfile.")
-            continue
 
-        #logs if it exists
-        response_json = json.loads(response.text)
-        if details["type"] == "access" and int(node) % 2 == 0 and response_json["imdata"] != []:
+        ##checks if interface seclector exists in even profile
+        if details["type"] == "access" and int(node) % 2 == 0 and int(port) in even_ports:
             print("\nInterface selector Port-" + port + " already exists in LEAF" + even + "_IntfProfile")
+            details["physical"] = inter
+            details["policy_group"] = policy_group
             config_port(details)
             continue
-        elif details["type"] != "access" and response_json["imdata"] != []:
+        elif details["type"] != "access" and int(port) in even_ports:
             print("\nInterface selector Port-" + port + " already exists in unexpected LEAF" + even + "_IntfProfile")
             continue
 
         ##checks if interface seclector exists in vpc profile
-        url = fabric + "/api/node/mo/uni/infra/accportprof-LEAF" + odd + "_LEAF" + even + "_IntfProfile/hports-Port-" + port + "-typ-range.json"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
-
-        #checks if successful response
-        if response.status_code != 200:
-            print("ERROR! could not verify if port " + inter + " is in LEAF" + odd + "_LEAF" + even + "_IntfProfile.")
-            continue
-
-        #logs if it exists
-        response_json = json.loads(response.text)
-        if details["type"] == "access" and int(node) % 2 == 0 and response_json["imdata"] != []:
+        if details["type"] == "access" and int(port) in vpc_ports:
             print("\nInterface selector Port-" + port + " already exists in unexpected LEAF" + odd + "_LEAF" + even + "_IntfProfile")
             continue
-        elif details["type"] == "access" and int(node) % 2 != 0 and response_json["imdata"] != []:
-            print("\nInterface selector Port-" + port + " already exists in unexpected LEAF" + odd + "_LEAF" + even + "_IntfProfile")
-            continue
-        elif details["type"] != "access" and response_json["imdata"] != []:
+        elif details["type"] != "access" and int(port) in vpc_ports:
             print("\nInterface selector Port-" + port + " already exists in LEAF" + odd + "_LEAF" + even + "_IntfProfile")
+            details["physical"] = inter
+            details["policy_group"] = policy_group
             config_port(details)
             continue
 
-        #creates interface selectors
-        if details["type"] != "access":
-            node1 = odd + "_LEAF" + even
-            bundle = "accbundle-"
-        else:
-            node1 = details["node"]
-            bundle = "accportgrp-"
+        new_ports.append((port, policy_group))
+        physical[port] = inter
+
+    if new_ports == []:
+        return
 
-        #request to add interface selector to leaf interface profile
-        url = fabric + "/api/node/mo/uni/infra/accportprof-LEAF" + node1 + "_IntfProfile/hports-Port-" + port + "-typ-range.json"
+    #creates interface selectors
+    if details["type"] != "access":
+        node1 = odd + "_LEAF" + even
+        bundle = "accbundle-"
+    else:
+        node1 = details["node"]
+        bundle = "accportgrp-"
+
+    #one selector per range of contiguous ports with the same policy group
+    selectors = []
+    for from_port, to_port, policy_group in coalesce(new_ports):
+        if from_port == to_port:
+            name = "Port-" + from_port
+        else:
+            name = "Port-" + from_port + "-" + to_port
 
-        payload = {
+        selectors.append({
             "infraHPortS": {
                 "attributes": {
-                    "dn": "uni/infra/accportprof-LEAF" + node1 + "_IntfProfile/hports-Port-" + port + "-typ-range",
-                    "name": "Port-" + port,
-                    "rn": "hports-Port-" + port + "-typ-range",
+                    "dn": "uni/infra/accportprof-LEAF" + node1 + "_IntfProfile/hports-" + name + "-typ-range",
+                    "name": name,
+                    "rn": "hports-" + name + "-typ-range",
                     "status": "created,modified"
                 },
                 "children": [
                 {
                     "infraPortBlk": {
                         "attributes": {
-                            "dn": "uni/infra/accportprof-LEAF" + node1 + "_IntfProfile/hports-Port-" + port + "-typ-range/portblk-block2",
-                            "fromPort": port,
-                            "toPort": port,
+                            "dn": "uni/infra/accportprof-LEAF" + node1 + "_IntfProfile/hports-" + name + "-typ-range/portblk-block2",
+                            "fromPort": from_port,
+                            "toPort": to_port,
                             "name": "block2",
                             "rn": "portblk-block2",
                             "status": "created,modified"
@@ -225,30 +249,83 @@ def access_policy(details):
                 }
                 ]
             }
-        }
+        })
+
+    #request to add all interface selectors to the leaf interface profile
+    url = fabric + "/api/node/mo/uni/infra/accportprof-LEAF" + node1 + "_IntfProfile.json"
 
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
+    payload = {
+        "infraAccPortP": {
+            "attributes": {
+                "dn": "uni/infra/accportprof-LEAF" + node1 + "_IntfProfile"
+            },
+            "children": selectors
         }
+    }
 
-        data = json.dumps(payload)
-        requests.packages.urllib3.disable_warnings()
-        response = requests.post(url, data=data, headers=headers, verify=False)
+    data = json.dumps(payload)
+    response = apic_client.post(url, data=data)
 
-        #logs if request is unsuccessful
-        if response.status_code != 200:
-            print("\nERROR! could not deploy " + inter + " on LEAF" + odd + "_IntfProfile.")
-            return
+    #logs if request is unsuccessful
+    if response.status_code != 200:
+        print("\nERROR! could not deploy " + str(len(new_ports)) + " port(s) on LEAF" + node1 + "_IntfProfile.")
+        return
 
-        #logs if interface selector is created
-        response_json = json.loads(response.text)
-        print("\nSuccessfully added Port-" + port + " with policy group " + policy_group + " to LEAF" + node + "_IntfProfile")
+    #logs if interface selectors are created
+    for selector in selectors:
+        attributes = selector["infraHPortS"]["attributes"]
+        policy_group = selector["infraHPortS"]["children"][1]["infraRsAccBaseGrp"]["attributes"]["tDn"].split(bundle, 1)[1]
+        print("\nSuccessfully added " + attributes["name"] + " with policy group " + policy_group + " to LEAF" + node1 + "_IntfProfile")
+
+    for port, policy_group in new_ports:
+        details["physical"] = physical[port]
+        details["policy_group"] = policy_group
         config_port(details)
 
+
+#builds {encap: [epg dn, ...]} for the requested vlans with one fvIfConn class query per VLAN_CHUNK vlans
+def get_encap_index(vlans):
+    encap_index = {}
+    vlans = [str(vlan) for vlan in vlans]
+
+    for i in range(0, len(vlans), VLAN_CHUNK):
+        encaps = [apic_query.eq("fvIfConn.encap", "vlan-" + vlan) for vlan in vlans[i:i + VLAN_CHUNK]]
+        url = apic_query.class_url(fabric, "fvIfConn", filter=apic_query.or_(*encaps))
+
+        imdata = apic_client.get_pages(url)
+
+        #checks if successful response
+        if imdata == None:
+            return
+
+        #Grabs each EPG the vlan is deployed on
+        for item in imdata:
+            path1 = re.findall('(?<=\[).+?(?=\])', item["fvIfConn"]["attributes"]["dn"])[0]
+            encap_index.setdefault(item["fvIfConn"]["attributes"]["encap"], set()).add(path1)
+
+    return({encap: list(epgs) for encap, epgs in encap_index.items()})
+
+
+#gets the static paths already deployed on an interface as {(epg dn, path tDn): encap}
+def get_static_paths(tdn):
+    url = apic_query.class_url(fabric, "fvRsPathAtt", filter=apic_query.eq("fvRsPathAtt.tDn", tdn), props="config-only")
+
+    imdata = apic_client.get_pages(url)
+
+    #checks if successful response
+    if imdata == None:
+        return
+
+    existing = {}
+    for item in imdata:
+        epg = item["fvRsPathAtt"]["attributes"]["dn"].split("/rspathAtt-")[0]
+        existing[(epg, tdn)] = item["fvRsPathAtt"]["attributes"]["encap"]
+
+    return(existing)
+
+
 #configures access static ports
 def config_port(details):
-    global token, timer
-
     #formats for vpc or access
     if details["type"] == "access":
         node = details["node"]
@@ -259,39 +336,33 @@ def config_port(details):
         paths = "protpaths-"
         interface = details["policy_group"]
 
-    for vlan in details["vlan"]:
-        vlan = str(vlan)
-
-        #checks what epg the vlan is deployed on
-        url = fabric + "/api/node/class/fvIfConn.json?query-target-filter=and(eq(fvIfConn.encap,\"vlan-" + vlan + "\"))"
+    tdn = "topology/pod-1/" + paths + node + "/pathep-[" + interface + "]"
 
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
+    #builds the vlan to epg index once for all interfaces in the request
+    if "encap_index" not in details:
+        details["encap_index"] = get_encap_index(details["vlan"])
+        details["epg_choice"] = {}
 
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
+    #gets every static path already deployed on the interface
+    existing = get_static_paths(tdn)
+    if details["encap_index"] == None or existing == None:
+        print("ERROR requesting EPG info for node " + node + " interface " + interface)
+        return
 
-        #checks if successful response
-        if response.status_code != 200:
-            print("ERROR requesting EPG info for vlan " + vlan)
-            continue
+    for vlan in details["vlan"]:
+        vlan = str(vlan)
 
-        response_json = json.loads(response.text)
+        #checks what epg the vlan is deployed on
+        vlan_list = details["encap_index"].get("vlan-" + vlan, [])
 
         #logs if vlan hasnt been deployed yet
-        if response_json["imdata"] == []:
+        if vlan_list == []:
             print("VLAN " + vlan + " is not deployed on any EPG. Please manually add static port.")
             continue
 
-        #Grabs each EPG the vlan is deployed on
-        vlan_list = []
-        for vlan2 in response_json["imdata"]:
-            path1 = re.findall('(?<=\[).+?(?=\])', vlan2["fvIfConn"]["attributes"]["dn"])[0]
-            vlan_list.append(path1)
-        vlan_list = list(set(vlan_list))
-
-        if len(vlan_list) > 1:
+        if vlan in details["epg_choice"]:
+            path = details["epg_choice"][vlan]
+        elif len(vlan_list) > 1:
             while True:
                 print("\nMultiple EPGs use this vlan:")
                 for i in vlan_list:
@@ -301,6 +372,7 @@ def config_port(details):
                     print("Please enter one of the following epgs.")
                     continue
                 else:
+                    details["epg_choice"][vlan] = path
                     break
         else:
             path = str(vlan_list[0])
@@ -315,33 +387,10 @@ def config_port(details):
             continue
 
         #checks if vlan is already deployed on the EPG for that interface
-        url = fabric + "/api/node/mo/" + path + "/rspathAtt-[topology/pod-1/" + paths + node + "/pathep-[" + interface + "]].json"
-
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
-
-        #checks if successful response
-        if response.status_code != 200:
-            print("ERROR checking if vlan " + vlan + " is deployed on node " + node + " interface " + interface)
-            continue
-
-        response_json = json.loads(response.text)
-
-        #logs if vlan is already on the interface
-        if response_json["imdata"] != []:
+        if (path, tdn) in existing:
             print("Static port " + interface + " already deployed for vlan " + vlan + " on node " + node + " in EPG " + path)
             continue
 
-        c_timer = time.time()
-        d_timer = c_timer - timer
-        if d_timer >= 540:
-            token = get_token.refresh_token(fabric, token)
-            timer = time.time()
-        
         #deploys static port on epg
         url = fabric + "/api/node/mo/" + path + "/rspathAtt-[topology/pod-1/" + paths + node + "/pathep-[" + interface + "]].json"
 
@@ -359,100 +408,208 @@ def config_port(details):
             }
         }
 
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
+        #queues the static port for deploy_bulk
+        if BULK_DEPLOY == True:
+            details.setdefault("pending", []).append({"url": url, "payload": payload, "epg": path, "interface": interface, "vlan": vlan, "node": node})
+            existing[(path, tdn)] = "vlan-" + vlan
+            continue
 
         data = json.dumps(payload)
-        requests.packages.urllib3.disable_warnings()
-        response = requests.post(url, data=data, headers=headers, verify=False)
+        response = apic_client.post(url, data=data)
 
         #logs unsuccessful request
         if response.status_code != 200:
             print("Could not deploy static port " + interface + " for vlan " + vlan + " on node " + node + " in EPG " + path)
             continue
         #logs successful request
-        response_json = json.loads(response.text)
+        existing[(path, tdn)] = "vlan-" + vlan
         print("Static port " + interface + " deployed for vlan " + vlan + " on node " + node + " in EPG " + path)
 
 
-#Checks if the interface is an access, port channel or VPC
+#builds an fvTenant subtree with the static paths nested under their application profile and epg
+def tenant_payload(tenant, items):
+    aps = {}
+    for item in items:
+        ap = item["epg"].rsplit("/", 1)[0]
+        aps.setdefault(ap, {}).setdefault(item["epg"], []).append(item["payload"])
+
+    children = []
+    for ap, epgs in aps.items():
+        epg_children = []
+        for epg, paths in epgs.items():
+            epg_children.append({"fvAEPg": {"attributes": {"dn": epg}, "children": paths}})
+        children.append({"fvAp": {"attributes": {"dn": ap}, "children": epg_children}})
+
+    return({"fvTenant": {"attributes": {"dn": tenant}, "children": children}})
+
+
+#posts static path objects grouped by tenant in size bounded fvTenant payloads, with up to workers tenants at a time.
+#Each chunk is committed by the APIC as one transaction. If a chunk fails its objects are sent one at a time so
+#failures are reported per static port. Returns True/False for each item in the same order as items
+def post_by_tenant(items, workers=1):
+    tenants = {}
+    for i, item in enumerate(items):
+        tenant = "/".join(item["epg"].split("/")[:2])
+        tenants.setdefault(tenant, []).append(i)
+
+    results = [False] * len(items)
+
+    def post_tenant(tenant, indexes):
+        url = fabric + "/api/node/mo/" + tenant + ".json"
+        position = 0
+        for chunk in apic_client.chunk_children([items[i]["payload"] for i in indexes]):
+            chunk_indexes = indexes[position:position + len(chunk)]
+            position += len(chunk)
+
+            data = json.dumps(tenant_payload(tenant, [items[i] for i in chunk_indexes]))
+            response = apic_client.post(url, data=data)
+
+            if response.status_code == 200:
+                for i in chunk_indexes:
+                    results[i] = True
+                continue
+
+            print("ERROR! Could not post " + str(len(chunk)) + " static ports in " + tenant + ", retrying one at a time.")
+
+            for i in chunk_indexes:
+                response = apic_client.post(items[i]["url"], data=json.dumps(items[i]["payload"]))
+                results[i] = response.status_code == 200
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(post_tenant, tenant, indexes) for tenant, indexes in tenants.items()]:
+            future.result()
+
+    return(results)
+
+
+#posts the queued static ports
+def deploy_bulk(details):
+    pending = details.get("pending", [])
+
+    for item, deployed in zip(pending, post_by_tenant(pending, TENANT_WORKERS)):
+        if deployed == True:
+            print("Static port " + item["interface"] + " deployed for vlan " + item["vlan"] + " on node " + item["node"] + " in EPG " + item["epg"])
+        else:
+            print("Could not deploy static port " + item["interface"] + " for vlan " + item["vlan"] + " on node " + item["node"] + " in EPG " + item["epg"])
+
+    details["pending"] = []
+
+
+#Checks if the interface is an access, port channel or VPC, then removes all of the interfaces from their EPGs after one confirmation
 def decom_check(details):
     node = details["node"]
     interface = details["interface"]
 
+    #interfaces that could not be checked are reported and left alone, the rest are still removed
+    plans = []
+    skipped = []
     for inter in interface:
         details["interface"] = inter
         #checks if interface is in a port-channel
-        url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/phys-[" + inter + "].json?query-target=children&target-subtree-class=relnFrom"
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-        requests.packages.urllib3.disable_warnings()
-        response = requests.get(url, headers=headers, verify=False)
+        url = apic_query.mo_url(fabric, "topology/pod-1/node-" + node + "/sys/phys-[" + inter + "]", target="children", target_class="relnFrom")
+        response = apic_client.get(url)
 
         #If not status code 200, skip request
         if response.status_code != 200:
             print("ERROR! Could not complete request for node " + node + " interface " + inter + ".")
             print(response)
+            skipped.append(inter)
             continue
 
-        response_json = json.loads(response.text)
+        response_json = apic_client.loads(response.content)
         child_obj = response_json["imdata"]
 
         #Checks if interface is in port-channel. Call port-channel function if so.
         if any("l1RtMbrIfs" in d for d in child_obj):
             #gets the policy group name
-            url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/phys-[" + inter + "].json?rsp-subtree-include=relations"
-            headers = {
-                "Cookie" : f"APIC-Cookie={token}", 
-            }
-            requests.packages.urllib3.disable_warnings()
-            response = requests.get(url, headers=headers, verify=False)
+            url = apic_query.mo_url(fabric, "topology/pod-1/node-" + node + "/sys/phys-[" + inter + "]", subtree_include="relations")
+            response = apic_client.get(url)
 
             #If not status code 200, skip request
             if response.status_code != 200:
                 print("ERROR! Could not complete request for node " + node + " interface " + inter+ ".")
                 print(response)
-                return
+                skipped.append(inter)
+                continue
 
-            response_json = json.loads(response.text)
+            response_json = apic_client.loads(response.content)
 
             #Gets po id and policy group
             obj = response_json["imdata"]
-            if any("pcAggrIf" in d for d in obj):
-                for ele in obj:
-                    for key, value in ele.items():
-                        if key == "pcAggrIf":
-                            details["po_pg"] = value["attributes"]["name"]
-                            details["po_id"] = value["attributes"]["id"]
+            if not any("pcAggrIf" in d for d in obj):
+                print("ERROR! Could not find the port-channel for node " + node + " interface " + inter + ".")
+                skipped.append(inter)
+                continue
+            for ele in obj:
+                for key, value in ele.items():
+                    if key == "pcAggrIf":
+                        details["po_pg"] = value["attributes"]["name"]
+                        details["po_id"] = value["attributes"]["id"]
 
             #checks if po is in VPC
-            url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/aggr-[" + details["po_id"] + "].json?query-target=children&target-subtree-class=relnFrom"
-            headers = {
-                "Cookie" : f"APIC-Cookie={token}", 
-            }
-            requests.packages.urllib3.disable_warnings()
-            response = requests.get(url, headers=headers, verify=False)
+            url = apic_query.mo_url(fabric, "topology/pod-1/node-" + node + "/sys/aggr-[" + details["po_id"] + "]", target="children", target_class="relnFrom")
+            response = apic_client.get(url)
 
             #If not status code 200, skip request
             if response.status_code != 200:
                 print("ERROR! Could not complete request for node " + node + " interface " + inter + ".")
                 print(response)
-                return
+                skipped.append(inter)
+                continue
 
-            response_json = json.loads(response.text)
+            response_json = apic_client.loads(response.content)
             child_obj = response_json["imdata"]
 
             if any("pcRtVpcConf" in d for d in child_obj):
-                decom_vpc(details)
-                continue
+                plan = decom_vpc(details)
             else:
-                decom_po(details)
-                continue
+                plan = decom_po(details)
         else:
-            decom_access(details)
+            plan = decom_access(details)
+
+        if plan != None:
+            plans.append(plan)
+
+    if plans == []:
+        return
+
+    #confirms once for the whole list of interfaces
+    print("")
+    for plan in plans:
+        print(plan["label"] + ": " + str(len(plan["items"])) + " EPG(s)")
+    if skipped != []:
+        print("Skipped (could not be checked, will not be changed): " + ", ".join(skipped))
+    while True:
+        ans = input("\nConfirm you want to remove the " + str(len(plans)) + " interface(s) above from their EPG(s)? (y or n): ")
+        ans_low = ans.lower()
+        if ans_low != "y" and ans_low != "n":
+            print("Please enter y or n.")
             continue
+        else:
+            break
+    if ans_low == "n":
+        return
+
+    #the same static port can show up for more than one interface (ex. two members of a vpc), it is only deleted once
+    unique = {}
+    for plan in plans:
+        for item in plan["items"]:
+            unique.setdefault(item["payload"]["fvRsPathAtt"]["attributes"]["dn"], item)
+
+    items = list(unique.values())
+    results = dict(zip(unique.keys(), post_by_tenant(items, TENANT_WORKERS)))
+
+    #reports each static port and removes the interface selector once all of its static ports are gone
+    for plan in plans:
+        removed = True
+        for item in plan["items"]:
+            if results[item["payload"]["fvRsPathAtt"]["attributes"]["dn"]] == True:
+                print(item["message"])
+            else:
+                print("ERROR! Could not remove " + plan["label"] + " from " + item["epg"] + ".")
+                removed = False
+        if removed == True:
+            plan["policy"](plan["details"])
 
 
 #Decoms access ports
@@ -461,12 +618,8 @@ def decom_access(details):
     interface = details["interface"]
 
     #gets all EPGs for interface
-    url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/phys-[" + interface + "].json?rsp-subtree-include=full-deployment&target-node=all&target-path=l1EthIfToEPg"
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
-    requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
+    url = apic_query.mo_url(fabric, "topology/pod-1/node-" + node + "/sys/phys-[" + interface + "]", subtree_include="full-deployment", target_node="all", target_path="l1EthIfToEPg")
+    response = apic_client.get(url)
 
     #If not status code 200, skip request
     if response.status_code != 200:
@@ -474,7 +627,7 @@ def decom_access(details):
         print(response)
         return
 
-    response_json = json.loads(response.text)
+    response_json = apic_client.loads(response.content)
 
     obj = response_json["imdata"][0]["l1PhysIf"]
 
@@ -495,45 +648,14 @@ def decom_access(details):
             for val2 in val.values():
                 list1.append(val2["ctxDn"])
 
-    #confirms user wants to remove static ports from epgs
-    while True:
-        ans = input("\nConfirm you want to remove " + interface + " on node " + node + " from " + str(len(list1)) + " EPG(s)? (y or n): ")
-        ans_low = ans.lower()
-        if ans_low != "y" and ans_low != "n":
-            print("Please enter y or n.")
-            continue
-        else:
-            break
-    if ans_low == "n":
-        return
-
-    #loops through epgs and removes static port
+    #builds the static port deletes for the epgs
+    items = []
     for epg in list1:
-
         url = fabric + "/api/node/mo/" + epg + "/rspathAtt-[topology/pod-1/paths-" + node + "/pathep-[" + interface + "]].json"
-
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-
         payload = {"fvRsPathAtt":{"attributes":{"dn": epg + "/rspathAtt-[topology/pod-1/paths-" + node + "/pathep-[" + interface + "]]","status":"deleted"},"children":[]}}
+        items.append({"url": url, "payload": payload, "epg": epg, "message": "Node " + node + " Interface " + interface + " removed from " + epg})
 
-        data = json.dumps(payload)
-        requests.packages.urllib3.disable_warnings()
-        response = requests.post(url, data=data, headers=headers, verify=False)
-
-        #If not status code 200, skip request
-        if response.status_code != 200:
-            print("ERROR! Could not complete request for node " + node + " interface " + interface + ".")
-            print(response)
-            return
-
-        response_json = json.loads(response.text)
-
-        if response.status_code == 200:
-            print("Node " + node + " Interface " + interface + " removed from " + epg)
-
-    po_policy(details)
+    return({"label": interface + " on node " + node, "items": items, "policy": po_policy, "details": dict(details)})
 
 #Decoms port channel ports
 def decom_po(details):
@@ -543,19 +665,15 @@ def decom_po(details):
     po_id = details["po_id"]
     
     #gets all epgs for the po
-    url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/aggr-" + po_id + ".json?rsp-subtree-include=full-deployment&target-node=all&target-path=l1EthIfToEPg"
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
-    requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
+    url = apic_query.mo_url(fabric, "topology/pod-1/node-" + node + "/sys/aggr-" + po_id, subtree_include="full-deployment", target_node="all", target_path="l1EthIfToEPg")
+    response = apic_client.get(url)
     #If not status code 200, skip request
     if response.status_code != 200:
         print("ERROR! Could not complete request for node " + node + " interface " + interface + ".")
         print(response)
         return
 
-    response_json = json.loads(response.text)
+    response_json = apic_client.loads(response.content)
 
     obj = response_json["imdata"][0]["pcAggrIf"]
 
@@ -576,45 +694,14 @@ def decom_po(details):
             for val2 in val.values():
                 list1.append(val2["ctxDn"])
 
-    #confirms if user wants to remove static port from epgs
-    while True:
-        ans = input("\nConfirm you want to remove " + po_pg + " on node " + node + " from " + str(len(list1)) + " EPG(s)? (y or n): ")
-        ans_low = ans.lower()
-        if ans_low != "y" and ans_low != "n":
-            print("Please enter y or n.")
-            continue
-        else:
-            break
-    if ans_low == "n":
-        return
-
-    #loops through epgs and removes static port
+    #builds the static port deletes for the epgs
+    items = []
     for epg in list1:
-
         url = fabric + "/api/node/mo/" + epg + "/rspathAtt-[topology/pod-1/paths-" + node + "/pathep-[" + po_pg + "]].json"
-
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-
         payload = {"fvRsPathAtt":{"attributes":{"dn": epg + "/rspathAtt-[topology/pod-1/paths-" + node + "/pathep-[" + po_pg + "]]","status":"deleted"},"children":[]}}
+        items.append({"url": url, "payload": payload, "epg": epg, "message": "Node " + node + " Interface " + po_pg + " removed from " + epg})
 
-        data = json.dumps(payload)
-        requests.packages.urllib3.disable_warnings()
-        response = requests.post(url, data=data, headers=headers, verify=False)
-
-        #If not status code 200, skip request
-        if response.status_code != 200:
-            print("ERROR! Could not complete request for node " + node + " interface " + interface + ".")
-            print(response)
-            return
-
-        response_json = json.loads(response.text)
-
-        if response.status_code == 200:
-            print("Node " + node + " Interface " + po_pg + " removed from " + epg)
-        
-    po_policy(details)
+    return({"label": po_pg + " on node " + node, "items": items, "policy": po_policy, "details": dict(details)})
 
 
 #Decoms VPC ports
@@ -633,19 +720,15 @@ def decom_vpc(details):
         even = node
 
     #gets all epgs for the vpc
-    url = fabric + "/api/node/mo/topology/pod-1/node-" + node + "/sys/aggr-" + po_id + ".json?rsp-subtree-include=full-deployment&target-node=all&target-path=l1EthIfToEPg"
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
-    requests.packages.urllib3.disable_warnings()
-    response = requests.get(url, headers=headers, verify=False)
+    url = apic_query.mo_url(fabric, "topology/pod-1/node-" + node + "/sys/aggr-" + po_id, subtree_include="full-deployment", target_node="all", target_path="l1EthIfToEPg")
+    response = apic_client.get(url)
     #If not status code 200, skip request
     if response.status_code != 200:
         print("ERROR! Could not complete request for node " + odd + " and " + even + " interface " + interface + ".")
         print(response)
         return
 
-    response_json = json.loads(response.text)
+    response_json = apic_client.loads(response.content)
 
     obj = response_json["imdata"][0]["pcAggrIf"]
 
@@ -664,72 +747,80 @@ def decom_vpc(details):
             for val2 in val.values():
                 list1.append(val2["ctxDn"])
 
-    while True:
-        ans = input("\nConfirm you want to remove " + vpc_pg + " on node " + odd + "-" + even + " from " + str(len(list1)) + " EPG(s)? (y or n): ")
-        ans_low = ans.lower()
-        if ans_low != "y" and ans_low != "n":
-            print("Please enter y or n.")
-            continue
-        else:
-            break
-    if ans_low == "n":
-        return
-
+    #builds the static port deletes for the epgs
+    items = []
     for item in list1:
-
         url = fabric + "/api/node/mo/" + item + "/rspathAtt-[topology/pod-1/protpaths-" + odd + "-" + even + "/pathep-[" + vpc_pg + "]].json"
-
-        headers = {
-            "Cookie" : f"APIC-Cookie={token}", 
-        }
-
         payload = {"fvRsPathAtt":{"attributes":{"dn": item + "/rspathAtt-[topology/pod-1/protpaths-" + odd + "-" + even + "/pathep-[" + vpc_pg + "]]","status":"deleted"},"children":[]}}
+        items.append({"url": url, "payload": payload, "epg": item, "message": "Node " + odd + "-" + even + " Interface " + vpc_pg + " removed from " + item})
 
-        data = json.dumps(payload)
-        requests.packages.urllib3.disable_warnings()
-        response = requests.post(url, data=data, headers=headers, verify=False)
-
-        #If not status code 200, skip request
-        if response.status_code != 200:
-            print("ERROR! Could not complete request for node " + odd + " and " + even + " interface " + interface + ".")
-            print(response)
-            return
-
-        response_json = json.loads(response.text)
+    return({"label": vpc_pg + " on node " + odd + "-" + even, "items": items, "policy": vpc_policy, "details": dict(details)})
 
-        if response.status_code == 200:
-            print("Node " + odd + "-" + even + " Interface " + vpc_pg + " removed from " + item)
 
-    vpc_policy(details)
-
-
-def po_policy(details):
+#removes a port from the interface selector that covers it. A selector that only covers the port is deleted,
+#a range selector (ex. Port-21-29) keeps its other ports by shrinking or splitting the port block
+def remove_selector_port(profile, port):
+    selectors = get_selector_blocks(profile)
+    if selectors == None:
+        return
 
-    port = details["interface"].split("/")[1]
+    for selector_dn, blocks in selectors.items():
+        for block in blocks:
+            if block["fromPort"] <= port <= block["toPort"]:
+                break
+        else:
+            continue
+        break
+    else:
+        print("ERROR! No interface selector covers port " + str(port) + " in " + profile + ".")
+        return
 
-    url = fabric + "/api/node/mo/uni/infra/accportprof-LEAF" + details["node"] + "_IntfProfile/hports-Port-" + port + "-typ-range.json"
+    name = selector_dn.split("/hports-")[1].replace("-typ-range", "")
+    url = fabric + "/api/node/mo/" + selector_dn + ".json"
 
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
+    #the selector only covers this port
+    if sum(item["toPort"] - item["fromPort"] + 1 for item in blocks) == 1:
+        payload = {"infraHPortS":{"attributes":{"dn":selector_dn,"status":"deleted"},"children":[]}}
+        message = "Interface selector " + name + " succesfully removed from " + profile
+    else:
+        children = []
+        if block["fromPort"] == block["toPort"]:
+            children.append({"infraPortBlk":{"attributes":{"dn":block["dn"],"status":"deleted"},"children":[]}})
+        elif port == block["fromPort"]:
+            children.append({"infraPortBlk":{"attributes":{"dn":block["dn"],"fromPort":str(port + 1)},"children":[]}})
+        elif port == block["toPort"]:
+            children.append({"infraPortBlk":{"attributes":{"dn":block["dn"],"toPort":str(port - 1)},"children":[]}})
+        else:
+            #splits the block around the port
+            names = [item["name"] for item in blocks]
+            i = 2
+            while "block" + str(i) in names:
+                i += 1
+            children.append({"infraPortBlk":{"attributes":{"dn":block["dn"],"toPort":str(port - 1)},"children":[]}})
+            children.append({"infraPortBlk":{"attributes":{"dn":selector_dn + "/portblk-block" + str(i),"name":"block" + str(i),"fromPort":str(port + 1),"toPort":str(block["toPort"]),"status":"created"},"children":[]}})
 
-    payload = {"infraHPortS":{"attributes":{"dn":"uni/infra/accportprof-LEAF" + details["node"] + "_IntfProfile/hports-Port-" + port + "-typ-range","status":"deleted"},"children":[]}}
+        payload = {"infraHPortS":{"attributes":{"dn":selector_dn},"children":children}}
+        message = "Port " + str(port) + " succesfully removed from interface selector " + name + " in " + profile
 
     data = json.dumps(payload)
-    requests.packages.urllib3.disable_warnings()
-    response = requests.post(url, data=data, headers=headers, verify=False)
+    response = apic_client.post(url, data=data)
 
     #If not status code 200, skip request
     if response.status_code != 200:
-        print("ERROR! Could not delete access policy for " + details["node"] + " interface " + details["interface"] + ".")
+        print("ERROR! Could not remove port " + str(port) + " from interface selector " + name + " in " + profile + ".")
         print(response)
         return
-    else:
-        print("Interface selector port-" + port + " succesfully removed from LEAF" + details["node"] + "_IntfProfile")
 
+    print(message)
 
-def vpc_policy(details):
 
+def po_policy(details):
+    port = int(details["interface"].split("/")[1])
+
+    remove_selector_port("LEAF" + details["node"] + "_IntfProfile", port)
+
+
+def vpc_policy(details):
     node = details["node"]
     #grabs even and odd nodes
     if int(node) % 2 != 0:
@@ -739,31 +830,12 @@ def vpc_policy(details):
         odd = str(int(node) - 1)
         even = node
 
-    port = details["interface"].split("/")[1]
-
-    url = fabric + "/api/node/mo/uni/infra/accportprof-LEAF" + odd + "_LEAF" + even + "_IntfProfile/hports-Port-" + port + "-typ-range.json"
-
-    headers = {
-        "Cookie" : f"APIC-Cookie={token}", 
-    }
-
-    payload = {"infraHPortS":{"attributes":{"dn":"uni/infra/accportprof-LEAF" + odd + "_LEAF" + even + "_IntfProfile/hports-Port-" + port + "-typ-range","status":"deleted"},"children":[]}}
-
-    data = json.dumps(payload)
-    requests.packages.urllib3.disable_warnings()
-    response = requests.post(url, data=data, headers=headers, verify=False)
+    port = int(details["interface"].split("/")[1])
 
-    #If not status code 200, skip request
-    if response.status_code != 200:
-        print("ERROR! Could not delete access policy for " + details["node"] + " interface " + details["interface"] + ".")
-        print(response)
-        return
-    else:
-        print("Interface selector port-" + port + " succesfully removed from LEAF" + odd + "_LEAF" + even + "_IntfProfile")
+    remove_selector_port("LEAF" + odd + "_LEAF" + even + "_IntfProfile", port)
 
 
 def main():
-
     #takes pre-snapshot
     snapshot.snapshot_pre(change, token, fabric)
 
@@ -968,6 +1040,9 @@ def main():
             
             access_policy(details)
 
+            if BULK_DEPLOY == True:
+                deploy_bulk(details)
+
         #Calls function to decom ports
         if modify == "decom":
             decom_check(details)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+'''
+   This script runs one of the other scripts against several fabrics at the same time. Credentials and the change
+   number are asked for once, then one process is started per fabric. Output is labelled with the fabric name and a
+   summary is printed at the end.
+
+   example: python3 multi_fabric.py add_l2flood.py --fabrics qic,atl,brm,clt --answers y y
+
+   --answers are sent to the prompts of each script in order (ex. the pre and post snapshot prompts). A script that
+   asks for more input than it was given stops with an error instead of waiting.
+   Any other arguments (ex. --full-rescan) are passed through to the script.
+
+
+    File name: multi_fabric.py
+    Author: Nicholas Bogdajewicz
+    Date created: 10/18/2026
+    Date last modified: 10/18/2026
+    Python Version: 3.8.2
+'''
+
+import subprocess
+import threading
+import argparse
+import getpass
+import time
+import sys
+import os
+
+FABRICS = ["qic", "atl", "brm", "clt"]
+
+print_lock = threading.Lock()
+
+
+'''
+This function prompts for anything that wasn't passed on the command line, the same way get_token.py does
+'''
+def get_login(args):
+    name = args.name
+    pwd = args.pwd
+    change = args.chg
+
+    if name == None:
+        while True:
+            name = input("Input username: ")
+            answer = input("Is this the correct username? " + name + " (y or n): ")
+            if answer.lower() == "y":
+                break
+
+    if pwd == None:
+        while True:
+            pwd = getpass.getpass("Input password: ")
+            answer = input("Would you like to re-type your password? (y or n): ")
+            if answer.lower() == "n":
+                break
+
+    if change == None:
+        while True:
+            change = input("Input change number: ")
+            answer = input("Is this the correct change number? " + change + " (y or n): ")
+            if answer.lower() == "y":
+                break
+
+    return(name, pwd, change)
+
+
+'''
+This function runs the script for one fabric and prints its output line by line with the fabric name in front.
+Returns {"fabric", "returncode", "errors", "seconds"} for the summary.
+'''
+def run_fabric(site, script, name, pwd, change, answers, extra):
+
+    command = [sys.executable, "-u", script, "--fabric", site, "--user", name, "--chg", change] + extra
+
+    env = dict(os.environ)
+    env["APIC_PASS"] = pwd
+
+    start = time.monotonic()
+    errors = 0
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env, universal_newlines=True)
+
+    #answers the prompts up front and closes stdin so an unexpected prompt fails instead of hanging
+    try:
+        process.stdin.write("".join(answer + "\n" for answer in answers))
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+
+    for line in process.stdout:
+        line = line.rstrip("\n")
+        if "error" in line.lower():
+            errors += 1
+        with print_lock:
+            print("[" + site + "] " + line)
+
+    returncode = process.wait()
+
+    return({"fabric": site, "returncode": returncode, "errors": errors, "seconds": time.monotonic() - start})
+
+
+def summary(results, seconds):
+
+    print("\n" + "Fabric".ljust(8) + "Result".ljust(10) + "Errors".ljust(8) + "Seconds")
+    for result in results:
+        status = "ok" if result["returncode"] == 0 else "failed"
+        print(result["fabric"].ljust(8) + status.ljust(10) + str(result["errors"]).ljust(8) + str(round(result["seconds"], 1)))
+
+    print("\nTotal time " + str(round(seconds, 1)) + " seconds")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Example: python3 multi_fabric.py add_l2flood.py --fabrics qic,atl --user admin --chg CHG12345 --answers y y')
+    parser.add_argument("script", metavar='script', type=str, help='Script to run (ex. get_policy_group.py)')
+    parser.add_argument("--fabrics", dest="fabrics", metavar='', type=str, default=",".join(FABRICS), help='Comma separated list of fabrics (default qic,atl,brm,clt)')
+    parser.add_argument("--user", dest="name", metavar='', type=str, help='Enter username within sinle quotes')
+    parser.add_argument("--pass", dest="pwd", metavar='', type=str, help='Enter password within single quotes')
+    parser.add_argument("--chg", dest="chg", metavar='', type=str, help='Enter change number:')
+    parser.add_argument("--answers", dest="answers", metavar='', nargs='*', default=[], help='Answers sent to the prompts of the script in order')
+    args, extra = parser.parse_known_args()
+
+    sites = [site.strip().lower() for site in args.fabrics.split(",") if site.strip() != ""]
+    for site in sites:
+        if site not in FABRICS:
+            sys.exit("Error: unknown fabric " + site + ". Choose from qic, atl, brm or clt")
+
+    if not os.path.exists(args.script):
+        sys.exit("Error: could not find " + args.script)
+
+    name, pwd, change = get_login(args)
+
+    start = time.monotonic()
+
+    results = {}
+    threads = []
+    for site in sites:
+        thread = threading.Thread(target=lambda site=site: results.update({site: run_fabric(site, args.script, name, pwd, change, args.answers, extra)}))
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+    summary([results[site] for site in sites], time.monotonic() - start)
+
+    if any(result["returncode"] != 0 for result in results.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+'''
+   Reverse DNS lookups for a list of management IPs. Duplicate IPs are only looked up once, lookups run in parallel
+   with a timeout on each one, and results are kept in an LRU cache that is saved to disk between runs.
+   Failed lookups are cached as well (for NEGATIVE_TTL) so a dead PTR record doesn't slow down every run.
+
+
+    File name: resolver.py
+    Author: Nicholas Bogdajewicz
+    Date created: 10/18/2026
+    Date last modified: 10/18/2026
+    Python Version: 3.8.2
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import threading
+import socket
+import json
+import time
+import os
+
+#fcntl is only on linux/mac. Without it saves are still atomic, but two runs saving at the same time can drop each others new entries
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CACHE_FILE = "cache/dns_cache.json"
+CACHE_SIZE = 4096
+POSITIVE_TTL = 86400
+NEGATIVE_TTL = 3600
+LOOKUP_TIMEOUT = 5
+WORKERS = 16
+
+#{ip: [hostname or None, expiry time]} with the most recently used ip last
+cache = collections.OrderedDict()
+cache_lock = threading.Lock()
+
+
+'''
+This function loads the saved cache. Expired entries are dropped.
+'''
+def load(path=CACHE_FILE):
+
+    if not os.path.exists(path):
+        return
+
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        print("Could not read DNS cache " + path + ", starting with an empty cache.")
+        return
+
+    now = time.time()
+    with cache_lock:
+        for ip, entry in saved.items():
+            if entry[1] > now:
+                cache[ip] = entry
+
+
+'''
+This function saves the cache. The file is shared by runs against every fabric (multi_fabric.py runs them at the same
+time), so it is locked, merged with what other runs saved since it was loaded and replaced in one step.
+'''
+def save(path=CACHE_FILE):
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with open(path + ".lock", "w") as lock:
+        if fcntl != None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+        saved = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                saved = {}
+
+        #keeps the entry that expires last for each ip
+        now = time.time()
+        with cache_lock:
+            data = {ip: entry for ip, entry in saved.items() if entry[1] > now}
+            for ip, entry in cache.items():
+                if ip not in data or entry[1] >= data[ip][1]:
+                    data[ip] = entry
+
+        data = dict(sorted(data.items(), key=lambda item: item[1][1])[-CACHE_SIZE:])
+
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+
+'''
+This function returns (True, hostname) if the ip is in the cache and not expired, otherwise (False, None).
+hostname is None for a cached failed lookup.
+'''
+def cached(ip):
+
+    with cache_lock:
+        entry = cache.get(ip)
+        if entry == None:
+            return(False, None)
+        if entry[1] <= time.time():
+            del cache[ip]
+            return(False, None)
+        cache.move_to_end(ip)
+        return(True, entry[0])
+
+
+def store(ip, hostname):
+
+    ttl = POSITIVE_TTL if hostname != None else NEGATIVE_TTL
+
+    with cache_lock:
+        cache[ip] = [hostname, time.time() + ttl]
+        cache.move_to_end(ip)
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+'''
+This function looks up a single ip. The resolver call runs in a daemon thread so a hung PTR lookup is abandoned
+after timeout seconds instead of holding up the run or the exit of the script.
+'''
+def lookup(ip, resolver=socket.gethostbyaddr, timeout=LOOKUP_TIMEOUT):
+
+    result = {}
+
+    def run():
+        try:
+            result["hostname"] = resolver(ip)[0]
+        except (socket.herror, socket.gaierror, OSError):
+            result["hostname"] = None
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+
+    return(result.get("hostname"))
+
+
+'''
+This function resolves a list of ips and returns {ip: hostname or None}. Cached ips are not looked up again.
+resolver can be swapped for a stub that takes an ip and returns (hostname, aliases, ips) like socket.gethostbyaddr.
+'''
+def resolve_all(ips, resolver=socket.gethostbyaddr, workers=WORKERS, timeout=LOOKUP_TIMEOUT):
+
+    hostnames = {}
+    pending = []
+    for ip in dict.fromkeys(ips):
+        hit, hostname = cached(ip)
+        if hit == True:
+            hostnames[ip] = hostname
+        else:
+            pending.append(ip)
+
+    if pending != []:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda ip: lookup(ip, resolver, timeout), pending)
+            for ip, hostname in zip(pending, results):
+                store(ip, hostname)
+                hostnames[ip] = hostname
+
+    return(hostnames)
@@ -12,12 +12,73 @@
     requests version: 2.27.0
 '''
 
-import get_token
-import requests
+import apic_client
+import apic_query
 import json
 import time
 import sys
 
+#configJob states the APIC reports while an export runs
+JOB_RUNNING = ("pending", "running")
+
+#seconds to wait for the snapshot job before failing, and the first/max wait between status checks
+SNAPSHOT_TIMEOUT = 300
+POLL_START = 1
+POLL_MAX = 10
+
+
+'''
+This function returns {dn: attributes} for every configJob of the defaultOneTime export policy
+'''
+def get_jobs(fabric):
+
+  url = apic_query.mo_url(fabric, "uni/backupst/jobs-[uni/fabric/configexp-defaultOneTime]", target="children", target_class="configJob")
+  #the job status changes on its own, so it is never answered from the GET cache
+  response = apic_client.get(url, cache=False)
+
+  #the job container doesn't exist until the first export has run
+  if response.status_code == 404:
+    return({})
+  if response.status_code != 200:
+    sys.exit("Error: Could not read the snapshot job status. response: " + str(response))
+
+  response_json = apic_client.loads(response.content)
+
+  jobs = {}
+  for item in response_json["imdata"]:
+    attributes = item["configJob"]["attributes"]
+    jobs[attributes["dn"]] = attributes
+
+  return(jobs)
+
+
+'''
+This function polls the configJob started after the export was triggered (any job not in before) with backoff.
+It returns as soon as the job succeeds and exits the script if the job fails or does not finish within timeout.
+'''
+def wait_for_job(fabric, before, timeout=SNAPSHOT_TIMEOUT):
+
+  deadline = time.monotonic() + timeout
+  wait = POLL_START
+
+  while True:
+    jobs = get_jobs(fabric)
+    new = [attributes for dn, attributes in jobs.items() if dn not in before]
+
+    for attributes in new:
+      state = attributes["operSt"]
+      if state == "success":
+        return(attributes)
+      if state not in JOB_RUNNING:
+        sys.exit("Error: Snapshot job " + attributes["dn"] + " ended with " + state + ". " + attributes.get("details", ""))
+
+    if time.monotonic() + wait > deadline:
+      sys.exit("Error: Snapshot did not complete within " + str(timeout) + " seconds")
+
+    time.sleep(wait)
+    wait = min(wait * 2, POLL_MAX)
+
+
 def snapshot_pre(change, token, fabric):
 
   while True:
@@ -50,21 +111,17 @@ def snapshot_pre(change, token, fabric):
     }
   }
 
-
-  headers = {
-    "Cookie" : f"APIC-Cookie={token}", 
-  }
-
   data = json.dumps(payload)
 
-  requests.packages.urllib3.disable_warnings()
-  response = requests.post(url, headers=headers, data=data, verify=False)
+  #jobs from earlier exports, so only the job started by this trigger is checked
+  before = get_jobs(fabric)
+
+  response = apic_client.post(url, data=data)
   if response.status_code != 200:
     sys.exit("Error: Could not complete the snapshot")
-  response_json = json.loads(response.text)
 
   print("Please wait while pre-change snapshot is in progress.")
-  time.sleep(15)
+  wait_for_job(fabric, before)
   print("Pre-change snapshot Successful\n")
 
 
@@ -99,25 +156,23 @@ def snapshot_post(change, token, fabric):
     }
   }
 
-
-  headers = {
-    "Cookie" : f"APIC-Cookie={token}", 
-  }
-
   data = json.dumps(payload)
 
-  requests.packages.urllib3.disable_warnings()
-  response = requests.post(url, headers=headers, data=data, verify=False)
+  #jobs from earlier exports, so only the job started by this trigger is checked
+  before = get_jobs(fabric)
+
+  response = apic_client.post(url, data=data)
   if response.status_code != 200:
     sys.exit("Error: Could not complete the snapshot")
-  response_json = json.loads(response.text)
 
+  print("Please wait while post-change snapshot is in progress.")
+  wait_for_job(fabric, before)
   print("\nPost-change snapshot Successful")
 
 
 def main():
   #Logs into fabric and saves token, url and change number
-  login = get_token.get_token()
+  login = apic_client.login()
   token = login[0]
   fabric = login[1]
   change = login[2]
@@ -0,0 +1,80 @@
+import importlib
+import json
+import io
+import sys
+import os
+
+import pytest
+
+#the scripts live in the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FABRIC = "https://qic-fabric.qic.tiaa-cref.org"
+
+
+class FakeResponse:
+    def __init__(self, body=None, status_code=200):
+        self.status_code = status_code
+        self.text = json.dumps(body if body != None else {"totalCount": "0", "imdata": []})
+        self.content = self.text.encode()
+        #read by apic_client.stream_imdata when ijson is installed
+        self.raw = io.BytesIO(self.content)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    '''
+    Stands in for the requests session in apic_client. get_handler(url) returns the FakeResponse for a GET,
+    every GET and POST url is recorded.
+    '''
+    def __init__(self, get_handler=None):
+        self.get_handler = get_handler or (lambda url: FakeResponse())
+        self.gets = []
+        self.posts = []
+
+    def get(self, url, stream=False):
+        self.gets.append(url)
+        return(self.get_handler(url))
+
+    def post(self, url, data=None):
+        self.posts.append((url, data))
+        return(FakeResponse({"totalCount": "0", "imdata": []}))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    '''
+    apic_client with a fake session and an empty GET cache, and the on-disk MO cache turned off
+    '''
+    pytest.importorskip("requests")
+    import apic_client
+    import mo_cache
+
+    session = FakeSession()
+    monkeypatch.setattr(apic_client, "session", session)
+    monkeypatch.setattr(apic_client, "fabric", FABRIC)
+    monkeypatch.setattr(apic_client, "RATE_LIMIT", 0)
+    monkeypatch.setattr(mo_cache, "ENABLED", False)
+    apic_client.get_cache.clear()
+
+    yield apic_client
+
+    apic_client.get_cache.clear()
+
+
+@pytest.fixture
+def load_script(client, monkeypatch, tmp_path):
+    '''
+    Imports a script without logging in. The scripts log in when they are imported, so apic_client.login is replaced first.
+    '''
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("logs", exist_ok=True)
+    monkeypatch.setattr(client, "login", lambda *args, **kwargs: ("token", FABRIC, "CHG0000000"))
+
+    def load(name):
+        sys.modules.pop(name, None)
+        return(importlib.import_module(name))
+
+    return(load)
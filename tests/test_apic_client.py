@@ -0,0 +1,124 @@
+import json
+import re
+
+import pytest
+
+from conftest import FABRIC, FakeResponse
+
+
+def paged(objects):
+    '''
+    GET handler that answers page/page-size queries from a list of objects
+    '''
+    def handler(url):
+        page = int(re.findall(r'page=(\d+)', url)[0])
+        size = int(re.findall(r'page-size=(\d+)', url)[0])
+        return(FakeResponse({"totalCount": str(len(objects)), "imdata": objects[page * size:(page + 1) * size]}))
+    return(handler)
+
+
+def test_chunk_children_stays_under_max_bytes(client):
+    children = [{"fvRsPathAtt": {"attributes": {"dn": "x" * 40}}} for i in range(10)]
+    size = len(json.dumps(children[0])) + 1
+
+    chunks = list(client.chunk_children(children, max_bytes=size * 3))
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+    assert sum(chunks, []) == children
+
+
+def test_chunk_children_keeps_oversized_child(client):
+    chunks = list(client.chunk_children([{"a": "x" * 100}, {"b": 1}], max_bytes=10))
+
+    assert chunks == [[{"a": "x" * 100}], [{"b": 1}]]
+
+
+def test_cache_key_normalizes_mo_queries(client):
+    dn, key = client.cache_key("https://QIC-fabric/api/node/mo/uni/tn-A.json?b=2&a=1")
+
+    assert dn == "uni/tn-A"
+    assert key == client.cache_key("https://qic-fabric/api/mo/uni/tn-A.json?a=1&b=2")[1]
+    assert client.cache_key("https://qic-fabric/api/node/class/fvBD.json") == (None, None)
+
+
+def test_iter_objects_pages_in_dn_order(client):
+    client.session.get_handler = paged(list(range(25)))
+
+    objects = list(client.iter_objects(FABRIC + "/api/node/class/fvBD.json", page_size=10))
+
+    assert objects == list(range(25))
+    assert len(client.session.gets) == 3
+    assert all("order-by=fvBD.dn" in url for url in client.session.gets)
+
+
+def test_iter_objects_yields_none_on_failure(client):
+    client.session.get_handler = lambda url: FakeResponse(status_code=500)
+
+    assert list(client.iter_objects(FABRIC + "/api/node/class/fvBD.json")) == [None]
+
+
+def test_mo_gets_are_cached_until_a_write_under_them(client):
+    url = FABRIC + "/api/node/mo/uni/tn-A/ap-B/epg-C.json"
+
+    client.get(url)
+    client.get(url)
+    assert len(client.session.gets) == 1
+
+    #a write somewhere else keeps the entry
+    client.post(FABRIC + "/api/node/mo/uni/tn-Other.json", data="{}")
+    client.get(url)
+    assert len(client.session.gets) == 1
+
+    #a write to a parent drops it
+    client.post(FABRIC + "/api/node/mo/uni/tn-A.json", data="{}")
+    client.get(url)
+    assert len(client.session.gets) == 2
+
+
+def test_topology_gets_are_dropped_on_any_write(client):
+    url = FABRIC + "/api/node/mo/topology/pod-1/node-101/sys/aggr-[po1].json"
+
+    client.get(url)
+    client.post(FABRIC + "/api/node/mo/uni/tn-A.json", data="{}")
+    client.get(url)
+
+    assert len(client.session.gets) == 2
+
+
+def test_get_cache_bypass(client):
+    url = FABRIC + "/api/node/mo/uni/backupst/jobs-[uni/fabric/configexp-defaultOneTime].json?query-target=children"
+
+    client.get(url, cache=False)
+    client.get(url, cache=False)
+
+    assert len(client.session.gets) == 2
+    assert client.get_cache == {}
+
+
+def test_failed_gets_are_not_cached(client):
+    client.session.get_handler = lambda url: FakeResponse(status_code=500)
+    url = FABRIC + "/api/node/mo/uni/tn-A.json"
+
+    client.get(url)
+    client.get(url)
+
+    assert len(client.session.gets) == 2
+
+
+def test_stream_imdata_reads_raw_bytes(client):
+    pytest.importorskip("ijson")
+    response = FakeResponse({"totalCount": "2", "imdata": [{"fvBD": {"attributes": {"dn": "uni/tn-A/BD-1"}}}, {"fvBD": {"attributes": {"dn": "uni/tn-A/BD-2"}}}]})
+
+    imdata, total = client.stream_imdata(response)
+
+    assert total == 2
+    assert [item["fvBD"]["attributes"]["dn"] for item in imdata] == ["uni/tn-A/BD-1", "uni/tn-A/BD-2"]
+    assert response.raw.decode_content == True
+
+
+def test_stream_imdata_counts_objects_without_total(client):
+    pytest.importorskip("ijson")
+
+    imdata, total = client.stream_imdata(FakeResponse({"imdata": [{"fvBD": {}}]}))
+
+    assert (imdata, total) == ([{"fvBD": {}}], 1)
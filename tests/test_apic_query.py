@@ -0,0 +1,29 @@
+import apic_query
+
+FABRIC = "https://qic-fabric.qic.tiaa-cref.org"
+
+
+def test_filters():
+    assert apic_query.eq("fvBD.name", "BD1") == 'eq(fvBD.name,"BD1")'
+    assert apic_query.wcard("faultInst.dn", "/aggr-") == 'wcard(faultInst.dn,"/aggr-")'
+    assert apic_query.and_(apic_query.eq("a.b", 1), apic_query.or_(apic_query.lt("a.c", 2), apic_query.ge("a.c", 5))) == 'and(eq(a.b,"1"),or(lt(a.c,"2"),ge(a.c,"5")))'
+    assert apic_query.not_(apic_query.ne("a.b", "x")) == 'not(ne(a.b,"x"))'
+
+
+def test_query_options():
+    assert apic_query.query() == ""
+    assert apic_query.query(filter=None) == ""
+    assert apic_query.query(target="children", target_class=["infraHPathS", "infraSHPathS"], props="config-only", order_by="fvBD.dn") == \
+        "?query-target=children&target-subtree-class=infraHPathS,infraSHPathS&rsp-prop-include=config-only&order-by=fvBD.dn"
+
+
+def test_unknown_options_use_dashes():
+    assert apic_query.query(subtree_include="full-deployment", target_node="all", target_path="l1EthIfToEPg") == \
+        "?rsp-subtree-include=full-deployment&target-node=all&target-path=l1EthIfToEPg"
+
+
+def test_class_and_mo_urls():
+    assert apic_query.class_url(FABRIC, "fabricNode") == FABRIC + "/api/node/class/fabricNode.json"
+    assert apic_query.class_url(FABRIC, "lldpIf", scope="topology/pod-1/node-101", subtree="children") == \
+        FABRIC + "/api/node/class/topology/pod-1/node-101/lldpIf.json?rsp-subtree=children"
+    assert apic_query.mo_url(FABRIC, "uni/infra", target="children") == FABRIC + "/api/node/mo/uni/infra.json?query-target=children"
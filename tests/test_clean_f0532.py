@@ -0,0 +1,274 @@
+import datetime
+import json
+import re
+
+import pytest
+
+from conftest import FakeResponse
+
+STANDALONE_FAULT = "topology/pod-1/node-101/sys/phys-[eth1/5]/phys/fault-F0532"
+EPG = "uni/tn-A/ap-B/epg-C"
+
+
+def fault(dn, last="2020-01-01T00:00:00.000+00:00"):
+    return({"faultInst": {"attributes": {"dn": dn, "code": "F0532", "lastTransition": last}}})
+
+
+def phys(node, eth, oper="down", usage="epg"):
+    return({"ethpmPhysIf": {"attributes": {"dn": "topology/pod-1/node-" + node + "/sys/phys-[" + eth + "]/phys", "operSt": oper, "usage": usage}}})
+
+
+def path(epg, tdn):
+    return({"fvRsPathAtt": {"attributes": {"dn": epg + "/rspathAtt-[" + tdn + "]", "tDn": tdn}}})
+
+
+def member(node, po, eth):
+    return({"pcRsMbrIfs": {"attributes": {"dn": "topology/pod-1/node-" + node + "/sys/aggr-[" + po + "]/rsmbrIfs-[" + eth + "]", "tSKey": eth}}})
+
+
+def bundle(node, po, policy_group):
+    tdn = "uni/infra/funcprof/accbundle-" + policy_group
+    return({"pcRtAccBndlGrpToAggrIf": {"attributes": {"dn": "topology/pod-1/node-" + node + "/sys/aggr-[" + po + "]/rtaccBndlGrpToAggrIf-[" + tdn + "]", "tDn": tdn}}})
+
+
+def vpc(node, po, dom_id, vpc_id):
+    inst = "topology/pod-1/node-" + node + "/sys/vpc/inst/dom-" + dom_id + "/if-" + vpc_id
+    return({"pcRtVpcConf": {"attributes": {"dn": "topology/pod-1/node-" + node + "/sys/aggr-[" + po + "]/rtvpcConf", "tDn": inst, "tSKey": vpc_id}}},
+           {"vpcRsVpcConf": {"attributes": {"dn": inst + "/rsvpcConf", "tSKey": po}}})
+
+
+def fabric_objects():
+    '''
+    Node 101: eth1/5 standalone, eth1/1-2 in port-channel po1 (PC_PG)
+    Nodes 103-104: vpc 5 in domain 10, po2 on 103 and po3 on 104 (VPC_PG), member eth1/10 on both
+    '''
+    vpc_103 = vpc("103", "po2", "10", "5")
+    vpc_104 = vpc("104", "po3", "10", "5")
+    return({
+        "ethpmPhysIf": [phys("101", "eth1/5"), phys("101", "eth1/1"), phys("101", "eth1/2"), phys("103", "eth1/10"), phys("104", "eth1/10")],
+        "pcRsMbrIfs": [member("101", "po1", "eth1/1"), member("101", "po1", "eth1/2"), member("103", "po2", "eth1/10"), member("104", "po3", "eth1/10")],
+        "pcRtAccBndlGrpToAggrIf": [bundle("101", "po1", "PC_PG"), bundle("103", "po2", "VPC_PG"), bundle("104", "po3", "VPC_PG")],
+        "pcRtVpcConf": [vpc_103[0], vpc_104[0]],
+        "vpcRsVpcConf": [vpc_103[1], vpc_104[1]],
+        "fvRsPathAtt": [path(EPG, "topology/pod-1/paths-101/pathep-[eth1/5]"), path(EPG, "topology/pod-1/paths-101/pathep-[PC_PG]"),
+                        path(EPG, "topology/pod-1/protpaths-103-104/pathep-[VPC_PG]"), path("uni/tn-A/ap-B/epg-D", "topology/pod-1/protpaths-103-104/pathep-[VPC_PG]")],
+    })
+
+
+def fabric_handler(objects, faults):
+    '''
+    GET handler for the class queries of clean_f0532. objects is {class: [imdata]}, faults is the F0532 fault list.
+    The port-channel fault query of prefetch() only gets the faults on aggr- interfaces.
+    '''
+    def handler(url):
+        cls = re.findall(r'/class/(\w+)\.json', url)[0]
+        if cls == "faultInst":
+            imdata = [item for item in faults if "wcard" not in url or "/aggr-" in item["faultInst"]["attributes"]["dn"]]
+        else:
+            imdata = objects.get(cls, [])
+        return(FakeResponse({"totalCount": str(len(imdata)), "imdata": imdata}))
+    return(handler)
+
+
+@pytest.fixture
+def clean(load_script, client, monkeypatch):
+    module = load_script("clean_f0532")
+    monkeypatch.setattr(module, "RATE_LIMIT", 0)
+    monkeypatch.setattr(module.snapshot, "snapshot_pre", lambda *args: None)
+    monkeypatch.setattr(module.snapshot, "snapshot_post", lambda *args: None)
+    monkeypatch.setattr(module.args, "full_rescan", False)
+    return(module)
+
+
+def saved_state(clean):
+    with open(clean.STATE_FILE) as f:
+        return(json.load(f))
+
+
+def test_failed_removal_still_saves_state(clean, client, monkeypatch, capsys):
+    client.session.get_handler = fabric_handler({"ethpmPhysIf": [phys("101", "eth1/5")], "fvRsPathAtt": [path(EPG, "topology/pod-1/paths-101/pathep-[eth1/5]")]}, [fault(STANDALONE_FAULT)])
+    monkeypatch.setattr(client.session, "post", lambda url, data=None: FakeResponse(status_code=400))
+
+    clean.main()
+
+    assert "ERROR! Could not remove port eth1/5 on node 101 from epg " + EPG in capsys.readouterr().out
+    #the failed fault holds the watermark back so it is queried again next run
+    assert saved_state(clean) == {"watermark": "2020-01-01T00:00:00.000+00:00", "processed": {}}
+
+
+def test_no_new_faults_skips_prefetch(clean, client, monkeypatch):
+    monkeypatch.setattr(clean, "prefetch", lambda *args: pytest.fail("prefetch should not run without faults"))
+
+    clean.main()
+
+    assert len(client.session.gets) == 1
+    assert saved_state(clean) == {"watermark": str(datetime.date.today() - datetime.timedelta(30)), "processed": {}}
+
+
+def test_prefetch_is_limited_to_the_fault_nodes_and_vpc_peers(clean, client):
+    assert clean.fault_nodes([fault(STANDALONE_FAULT), fault("topology/pod-1/node-204/sys/aggr-[po1]/aggrif/fault-F0532")]) == ["101", "102", "203", "204"]
+
+    clean.prefetch(["101", "102"])
+
+    for url in client.session.gets:
+        if "fvRsPathAtt" in url:
+            assert "query-target-filter" not in url
+        else:
+            assert 'or(wcard(' in url and '.dn,"/node-101/"),wcard(' in url and '.dn,"/node-102/"))' in url
+
+
+@pytest.fixture
+def indexed(clean, client):
+    client.session.get_handler = fabric_handler(fabric_objects(), [])
+    clean.prefetch()
+    return(clean)
+
+
+def test_prefetch_builds_the_indexes(indexed):
+    index = indexed.index
+
+    assert index["phys"][("101", "eth1/5")] == {"operSt": "down", "usage": "epg"}
+    assert index["members"][("101", "po1")] == ["eth1/1", "eth1/2"]
+    assert index["member_of"][("101", "eth1/2")] == "po1"
+    assert index["policy_group"][("104", "po3")] == "VPC_PG"
+    assert index["vpc"][("103", "po2")] == {"vpc_id": "5", "dom_id": "10"}
+    assert index["vpc_if"][("104", "10", "5")] == "po3"
+    assert index["epg"]["topology/pod-1/protpaths-103-104/pathep-[VPC_PG]"] == [EPG, "uni/tn-A/ap-B/epg-D"]
+
+
+def test_standalone_interface(indexed):
+    interface = indexed.split_int(fault(STANDALONE_FAULT))
+
+    assert interface == {"type": "standalone", "node": "101", "interface": "eth1/5"}
+    assert indexed.int_status(interface) == interface
+    assert indexed.get_epg(interface)["epg"] == [EPG]
+
+
+def test_port_channel_interface(indexed):
+    interface = indexed.split_int(fault("topology/pod-1/node-101/sys/phys-[eth1/2]/phys/fault-F0532"))
+
+    assert interface == {"type": "port-channel", "node": "101", "interface": "po1", "policy_group": "PC_PG"}
+    assert indexed.int_status(interface) == interface
+    assert indexed.get_epg(interface)["epg"] == [EPG]
+
+
+def test_vpc_interface_on_the_even_node_maps_to_the_odd_node(indexed):
+    interface = indexed.split_int(fault("topology/pod-1/node-104/sys/aggr-[po3]/aggrif/fault-F0532"))
+
+    assert interface == {"type": "VPC", "node": "103", "interface": "po2", "vpc_id": "5", "dom_id": "10", "policy_group": "VPC_PG"}
+    assert indexed.int_status(interface) == interface
+    assert indexed.get_epg(interface)["epg"] == [EPG, "uni/tn-A/ap-B/epg-D"]
+
+
+def test_interfaces_that_are_up_or_disabled_are_skipped(indexed):
+    indexed.index["phys"][("101", "eth1/5")] = {"operSt": "up", "usage": "epg"}
+    indexed.index["phys"][("101", "eth1/2")] = {"operSt": "down", "usage": "blacklist"}
+    indexed.index["phys"][("104", "eth1/10")] = {"operSt": "up", "usage": "epg"}
+
+    assert indexed.int_status({"type": "standalone", "node": "101", "interface": "eth1/5"}) == None
+    assert indexed.int_status({"type": "port-channel", "node": "101", "interface": "po1", "policy_group": "PC_PG"}) == None
+    #the vpc peer is up
+    assert indexed.int_status({"type": "VPC", "node": "103", "interface": "po2", "vpc_id": "5", "dom_id": "10", "policy_group": "VPC_PG"}) == None
+
+
+def test_faults_on_one_interface_are_grouped(indexed):
+    faults = [fault(STANDALONE_FAULT),
+              fault("topology/pod-1/node-101/sys/phys-[eth1/1]/phys/fault-F0532"),
+              fault("topology/pod-1/node-101/sys/phys-[eth1/2]/phys/fault-F0532"),
+              fault("topology/pod-1/node-103/sys/aggr-[po2]/aggrif/fault-F0532"),
+              fault("topology/pod-1/node-104/sys/aggr-[po3]/aggrif/fault-F0532")]
+
+    groups, failed = indexed.group_faults(faults)
+
+    assert [(group["interface"]["type"], group["interface"]["interface"], len(group["faults"])) for group in groups] == [("standalone", "eth1/5", 1), ("port-channel", "po1", 2), ("VPC", "po2", 2)]
+    assert failed == set()
+
+
+def test_member_faults_are_dropped_when_the_port_channel_has_a_fault(indexed):
+    indexed.index["po_fault"].add(("101", "po1"))
+
+    groups, failed = indexed.group_faults([fault("topology/pod-1/node-101/sys/phys-[eth1/1]/phys/fault-F0532"), fault("topology/pod-1/node-101/sys/aggr-[po1]/aggrif/fault-F0532")])
+
+    assert [group["faults"] for group in groups] == [["topology/pod-1/node-101/sys/aggr-[po1]/aggrif/fault-F0532"]]
+
+
+def test_faults_that_cannot_be_resolved_are_failed(indexed):
+    dn = "topology/pod-1/node-105/sys/aggr-[po9]/aggrif/fault-F0532"
+
+    groups, failed = indexed.group_faults([fault(dn)])
+
+    assert groups == []
+    assert failed == {dn}
+
+
+def test_pipeline_removes_each_interface_once_in_fault_order(clean, client, capsys):
+    faults = [fault(STANDALONE_FAULT),
+              fault("topology/pod-1/node-101/sys/phys-[eth1/1]/phys/fault-F0532"),
+              fault("topology/pod-1/node-104/sys/aggr-[po3]/aggrif/fault-F0532"),
+              fault("topology/pod-1/node-103/sys/aggr-[po2]/aggrif/fault-F0532")]
+    client.session.get_handler = fabric_handler(fabric_objects(), faults)
+
+    clean.main()
+
+    assert sorted(json.loads(data)["fvRsPathAtt"]["attributes"]["dn"] for url, data in client.session.posts) == sorted([
+        EPG + "/rspathAtt-[topology/pod-1/paths-101/pathep-[eth1/5]]",
+        EPG + "/rspathAtt-[topology/pod-1/paths-101/pathep-[PC_PG]]",
+        EPG + "/rspathAtt-[topology/pod-1/protpaths-103-104/pathep-[VPC_PG]]",
+        "uni/tn-A/ap-B/epg-D/rspathAtt-[topology/pod-1/protpaths-103-104/pathep-[VPC_PG]]"])
+
+    out = capsys.readouterr().out
+    requests = [out.index("-----Request: " + str(number) + "-----") for number in (1, 2, 3)]
+    assert requests == sorted(requests)
+    assert out.index("Standalone interface eth1/5") < requests[1] < out.index("Port-channel interface PC_PG") < requests[2] < out.index("VPC interface VPC_PG on node 103-104")
+    assert "-----Request: 4-----" not in out
+    assert saved_state(clean) == {"watermark": str(datetime.date.today() - datetime.timedelta(30)), "processed": {}}
+
+
+def test_interface_with_an_error_is_retried_next_run(clean, client):
+    objects = fabric_objects()
+    #no state for the port-channel members
+    objects["ethpmPhysIf"] = [phys("101", "eth1/5")]
+    pc_fault = fault("topology/pod-1/node-101/sys/phys-[eth1/1]/phys/fault-F0532", last="2020-02-01T00:00:00.000+00:00")
+    client.session.get_handler = fabric_handler(objects, [fault(STANDALONE_FAULT, last="2020-03-01T00:00:00.000+00:00"), pc_fault])
+
+    clean.main()
+
+    assert [json.loads(data)["fvRsPathAtt"]["attributes"]["dn"] for url, data in client.session.posts] == [EPG + "/rspathAtt-[topology/pod-1/paths-101/pathep-[eth1/5]]"]
+    assert saved_state(clean) == {"watermark": "2020-02-01T00:00:00.000+00:00", "processed": {STANDALONE_FAULT: "2020-03-01T00:00:00.000+00:00"}}
+
+
+def test_get_f0532_uses_the_age_threshold_and_watermark(clean, client):
+    start_date = datetime.date(2024, 3, 1)
+    old = fault(STANDALONE_FAULT, last="2024-01-15T00:00:00.000+00:00")
+    new = fault("topology/pod-1/node-101/sys/phys-[eth1/1]/phys/fault-F0532", last="2024-02-01T00:00:00.000+00:00")
+    client.session.get_handler = fabric_handler({}, [old, new])
+    state = {"watermark": "2024-01-01", "processed": {STANDALONE_FAULT: "2024-01-15T00:00:00.000+00:00"}}
+
+    #faults already processed with the same lastTransition are skipped
+    assert clean.get_f0532(start_date, state)["imdata"] == [new]
+    assert 'lt(faultInfo.lastTransition,"2024-03-01")' in client.session.gets[-1]
+    assert 'ge(faultInfo.lastTransition,"2024-01-01")' in client.session.gets[-1]
+
+    #--full-rescan ignores the watermark and the processed faults
+    assert clean.get_f0532(start_date, state, full_rescan=True)["imdata"] == [old, new]
+    assert 'lt(faultInfo.lastTransition,"2024-03-01")' in client.session.gets[-1]
+    assert "ge(" not in client.session.gets[-1]
+
+
+def test_state_is_saved_and_loaded_per_fabric(clean):
+    assert clean.load_state() == {"watermark": None, "processed": {}}
+    assert clean.STATE_FILE == "cache/clean_f0532_state_qic-fabric.json"
+
+    clean.save_state({"watermark": "2024-01-01", "processed": {"a": "2023-12-01T00:00:00.000+00:00", "b": "2024-01-02T00:00:00.000+00:00"}})
+
+    #faults from before the watermark are never queried again so they are dropped
+    assert clean.load_state() == {"watermark": "2024-01-01", "processed": {"b": "2024-01-02T00:00:00.000+00:00"}}
+
+
+def test_unreadable_state_runs_a_full_rescan(clean, capsys):
+    clean.save_state({"watermark": "2024-01-01", "processed": {}})
+    with open(clean.STATE_FILE, "w") as f:
+        f.write("{")
+
+    assert clean.load_state() == {"watermark": None, "processed": {}}
+    assert "running a full rescan" in capsys.readouterr().out
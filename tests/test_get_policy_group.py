@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from conftest import FakeResponse
+
+
+def response(imdata):
+    return(FakeResponse({"totalCount": str(len(imdata)), "imdata": imdata}))
+
+
+def relation(rn, storm_policy="SVS_Recommended"):
+    return({"infraRsStormctrlIfPol": {"attributes": {"dn": "uni/infra/funcprof/" + rn + "/rsstormctrlIfPol", "tnStormctrlIfPolName": storm_policy}}})
+
+
+@pytest.fixture
+def get_policy_group(load_script):
+    return(load_script("get_policy_group"))
+
+
+def test_storm_policy_is_filtered_by_the_apic(get_policy_group, client):
+    client.session.get_handler = lambda url: response([relation("accportgrp-PG1"), relation("accbundle-PG2")])
+
+    assert get_policy_group.get_storm_policy("SVS_Recommended") == {"accportgrp-PG1", "accbundle-PG2"}
+    assert 'query-target-filter=eq(infraRsStormctrlIfPol.tnStormctrlIfPolName,"SVS_Recommended")' in client.session.gets[0]
+
+
+def test_apply_bulk_sends_chunked_funcprof_payloads(get_policy_group, client, monkeypatch, capsys):
+    groups = [{"lag_type": "leaf", "policy_group": "PG" + str(number)} for number in range(4)] + [{"lag_type": "node", "policy_group": "VPC1"}]
+    post_bulk = client.post_bulk
+    monkeypatch.setattr(client, "post_bulk", lambda *args: post_bulk(*args, max_bytes=400))
+
+    get_policy_group.apply_bulk(groups, "SVS_Recommended")
+
+    assert len(client.session.posts) > 1
+    children = []
+    for url, data in client.session.posts:
+        payload = json.loads(data)
+        assert url == client.fabric + "/api/node/mo/uni/infra/funcprof.json"
+        assert payload["infraFuncP"]["attributes"] == {"dn": "uni/infra/funcprof"}
+        children.extend(payload["infraFuncP"]["children"])
+
+    assert [list(child)[0] + " " + list(child.values())[0]["attributes"]["dn"] for child in children] == \
+        ["infraAccPortGrp uni/infra/funcprof/accportgrp-PG" + str(number) for number in range(4)] + ["infraAccBndlGrp uni/infra/funcprof/accbundle-VPC1"]
+    assert all(list(child.values())[0]["children"] == [{"infraRsStormctrlIfPol": {"attributes": {"tnStormctrlIfPolName": "SVS_Recommended"}, "children": []}}] for child in children)
+    assert "SVS_Recommended deployed on policy group: VPC1" in capsys.readouterr().out
+
+
+def test_compliant_policy_groups_are_not_posted(get_policy_group, client):
+    def handler(url):
+        if "/class/infraAccPortGrp.json" in url:
+            return(response([{"infraAccPortGrp": {"attributes": {"name": "PG1"}}}, {"infraAccPortGrp": {"attributes": {"name": "PG2"}}}]))
+        if "/class/infraAccBndlGrp.json" in url:
+            return(response([{"infraAccBndlGrp": {"attributes": {"name": "VPC1", "lagT": "node"}}}]))
+        return(response([relation("accportgrp-PG1"), relation("accbundle-VPC1")]))
+    client.session.get_handler = handler
+
+    get_policy_group.main()
+
+    assert len(client.session.posts) == 1
+    children = json.loads(client.session.posts[0][1])["infraFuncP"]["children"]
+    assert [child["infraAccPortGrp"]["attributes"]["dn"] for child in children] == ["uni/infra/funcprof/accportgrp-PG2"]
@@ -0,0 +1,108 @@
+import json
+import re
+
+import pytest
+
+from conftest import FakeResponse
+
+
+def lldp(node, interface, sysname, sysdesc="Cisco NX-OS", mgmtip="unspecified"):
+    return({"lldpIf": {"attributes": {"dn": "topology/pod-1/node-" + node + "/sys/lldp/inst/if-[" + interface + "]", "id": interface},
+                       "children": [{"lldpAdjEp": {"attributes": {"sysName": sysname, "sysDesc": sysdesc, "mgmtIp": mgmtip}}}]}})
+
+
+def response(imdata):
+    return(FakeResponse({"totalCount": str(len(imdata)), "imdata": imdata}))
+
+
+@pytest.fixture
+def int_desc(load_script, monkeypatch):
+    module = load_script("int_desc")
+    monkeypatch.setattr(module.snapshot, "snapshot_pre", lambda *args: None)
+    monkeypatch.setattr(module.snapshot, "snapshot_post", lambda *args: None)
+    return(module)
+
+
+def test_lldp_neighbours_are_pulled_once_and_grouped_by_node(int_desc, client):
+    neighbours = [lldp("101", "eth1/1", "fw1"), lldp("102", "eth1/1", "fw2"), lldp("101", "eth1/2", "sw1")]
+    client.session.get_handler = lambda url: response(neighbours)
+
+    grouped = int_desc.get_lldp_bulk()
+
+    assert grouped == {"101": [neighbours[0], neighbours[2]], "102": [neighbours[1]]}
+    assert len(client.session.gets) == 1
+    assert re.search(r'/class/lldpIf\.json\?.*rsp-subtree-class=lldpAdjEp', client.session.gets[0])
+
+
+def node(nodeid, role="leaf"):
+    return({"fabricNode": {"attributes": {"dn": "topology/pod-1/node-" + nodeid, "fabricSt": "active", "role": role}}})
+
+
+def description(nodeid, interface, descr):
+    rn = "hpaths-" + nodeid + "_" + interface.replace("/", "_")
+    return({"infraHPathS": {"attributes": {"dn": "uni/infra/" + rn, "descr": descr},
+                            "children": [{"infraRsHPathAtt": {"attributes": {"tDn": "topology/pod-1/paths-" + nodeid + "/pathep-[" + interface + "]"}}}]}})
+
+
+def fabric_handler(nodes, neighbours, descriptions):
+    def handler(url):
+        if "/class/fabricNode.json" in url:
+            return(response(nodes))
+        if "/class/lldpIf.json" in url:
+            return(response(neighbours))
+        if "/mo/uni/infra.json" in url:
+            return(response(descriptions))
+        return(FakeResponse(status_code=404))
+    return(handler)
+
+
+@pytest.fixture
+def no_dns(int_desc, monkeypatch):
+    monkeypatch.setattr(int_desc.resolver, "load", lambda *args: None)
+    monkeypatch.setattr(int_desc.resolver, "save", lambda *args: None)
+    monkeypatch.setattr(int_desc.resolver, "resolve_all", lambda ips: {})
+
+
+def test_existing_descriptions_are_indexed_by_node_and_interface(int_desc, client):
+    client.session.get_handler = fabric_handler([], [], [description("101", "eth1/1", "* VRT * fw1"), description("102", "eth1/48", "")])
+
+    assert int_desc.get_descriptions() == {("101", "eth1/1"): "* VRT * fw1", ("102", "eth1/48"): ""}
+    assert "query-target=children" in client.session.gets[0] and "rsp-prop-include=config-only" in client.session.gets[0]
+
+
+def test_unchanged_descriptions_are_skipped(int_desc, client, no_dns, capsys):
+    neighbours = [lldp("101", "eth1/1", "fw1"), lldp("101", "eth1/2", "sw1"), lldp("101", "eth1/3", "server", sysdesc="Linux")]
+    client.session.get_handler = fabric_handler([node("101")], neighbours, [description("101", "eth1/1", "* VRT * fw1")])
+
+    with pytest.raises(SystemExit):
+        int_desc.main()
+
+    children = [child for url, data in client.session.posts for child in json.loads(data)["infraInfra"]["children"]]
+    assert [child["infraHPathS"]["attributes"]["dn"] for child in children] == ["uni/infra/hpaths-101_eth1_2"]
+    assert "1 interface descriptions were already up to date." in capsys.readouterr().out
+
+
+def pending(nodeid, interface, descr):
+    item = description(nodeid, interface, descr)
+    return({"node": nodeid, "interface": interface, "descr": descr, "payload": item})
+
+
+def test_descriptions_are_posted_in_batches_and_read_back(int_desc, client, monkeypatch, capsys, caplog):
+    items = [pending("101", "eth1/" + str(port), "* VRT * host" + str(port)) for port in range(1, 6)]
+    #eth1/5 did not take
+    client.session.get_handler = fabric_handler([], [], [item["payload"] for item in items[:4]])
+    post_bulk = client.post_bulk
+    monkeypatch.setattr(client, "post_bulk", lambda *args: post_bulk(*args, max_bytes=600))
+
+    int_desc.post_descriptions(items)
+
+    assert len(client.session.posts) > 1
+    for url, data in client.session.posts:
+        assert url == client.fabric + "/api/node/mo/uni/infra.json"
+        assert json.loads(data)["infraInfra"]["attributes"] == {"dn": "uni/infra"}
+    assert [child for url, data in client.session.posts for child in json.loads(data)["infraInfra"]["children"]] == [item["payload"] for item in items]
+
+    out = capsys.readouterr().out
+    assert all("Successfully added description * VRT * host" + str(port) + " to node 101 interface eth1/" + str(port) in out for port in range(1, 5))
+    assert "eth1/5" not in out
+    assert "Could not add interface description for node 101 interface eth1/5." in caplog.text
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+import mo_cache
+
+FABRIC = "https://qic-fabric.qic.tiaa-cref.org"
+NODES = FABRIC + "/api/node/class/fabricNode.json"
+PATHS = FABRIC + "/api/node/class/fvRsPathAtt.json"
+GROUPS = FABRIC + "/api/node/class/infraAccPortGrp.json"
+
+
+@pytest.fixture(autouse=True)
+def cache_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(mo_cache, "db", None)
+    monkeypatch.setattr(mo_cache, "ENABLED", True)
+    monkeypatch.setattr(mo_cache, "REFRESH", False)
+    mo_cache.connect(str(tmp_path / "mo_cache.db"))
+    yield
+    mo_cache.db.close()
+
+
+def test_only_listed_classes_are_cached():
+    assert mo_cache.class_of(NODES) == "fabricNode"
+    assert mo_cache.class_of(FABRIC + "/api/node/class/topology/pod-1/node-101/lldpIf.json") == None
+    assert mo_cache.class_of(FABRIC + "/api/node/mo/uni/infra.json") == None
+
+    mo_cache.store(FABRIC + "/api/node/class/faultInst.json", [{"a": 1}])
+    assert mo_cache.lookup(FABRIC + "/api/node/class/faultInst.json") == None
+
+
+def test_store_and_lookup():
+    mo_cache.store(NODES, [{"fabricNode": {"attributes": {"dn": "topology/pod-1/node-101"}}}])
+
+    assert mo_cache.lookup(NODES) == [{"fabricNode": {"attributes": {"dn": "topology/pod-1/node-101"}}}]
+
+
+def test_entries_expire_after_class_ttl(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(mo_cache.time, "time", lambda: now)
+    mo_cache.store(PATHS, [1])
+
+    monkeypatch.setattr(mo_cache.time, "time", lambda: now + mo_cache.CLASSES["fvRsPathAtt"][0] - 1)
+    assert mo_cache.lookup(PATHS) == [1]
+
+    monkeypatch.setattr(mo_cache.time, "time", lambda: now + mo_cache.CLASSES["fvRsPathAtt"][0] + 1)
+    assert mo_cache.lookup(PATHS) == None
+
+
+def test_refresh_and_no_cache(monkeypatch):
+    mo_cache.store(NODES, [1])
+
+    monkeypatch.setattr(mo_cache, "REFRESH", True)
+    assert mo_cache.lookup(NODES) == None
+
+    monkeypatch.setattr(mo_cache, "REFRESH", False)
+    monkeypatch.setattr(mo_cache, "ENABLED", False)
+    assert mo_cache.lookup(NODES) == None
+
+
+def test_least_recently_used_is_evicted_over_max_bytes(monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(mo_cache.time, "time", lambda: now[0])
+
+    mo_cache.store(NODES, ["x" * 100])
+    now[0] += 1
+    mo_cache.store(GROUPS, ["x" * 100])
+    now[0] += 1
+    mo_cache.lookup(NODES)
+    now[0] += 1
+
+    monkeypatch.setattr(mo_cache, "MAX_BYTES", 250)
+    mo_cache.store(PATHS, ["x" * 100])
+
+    assert mo_cache.lookup(GROUPS) == None
+    assert mo_cache.lookup(NODES) != None
+    assert mo_cache.lookup(PATHS) != None
+
+
+def test_invalidate_by_dn_prefix():
+    mo_cache.store(NODES, [1])
+    mo_cache.store(GROUPS, [2])
+    mo_cache.store(PATHS, [3])
+
+    mo_cache.invalidate(FABRIC, "uni/tn-common/ap-AP/epg-EPG")
+    assert mo_cache.lookup(PATHS) == None
+    assert mo_cache.lookup(GROUPS) == [2]
+
+    mo_cache.invalidate(FABRIC, "uni/infra/funcprof")
+    assert mo_cache.lookup(GROUPS) == None
+    assert mo_cache.lookup(NODES) == [1]
+
+    mo_cache.invalidate("https://atl-fabric.qic.tiaa-cref.org")
+    assert mo_cache.lookup(NODES) == [1]
+
+    mo_cache.invalidate(FABRIC)
+    assert mo_cache.lookup(NODES) == None
@@ -0,0 +1,41 @@
+import sys
+
+import pytest
+
+import multi_fabric
+
+#prints what it was started with, the atl run fails
+STUB = '''
+import sys, os
+site = sys.argv[sys.argv.index("--fabric") + 1]
+print("args " + " ".join(sys.argv[1:]))
+print("password " + os.environ.get("APIC_PASS", ""))
+print("answers " + " ".join(line.strip() for line in sys.stdin))
+if site == "atl":
+    print("ERROR! could not reach the fabric")
+    sys.exit(1)
+'''
+
+
+def test_runs_the_script_once_per_fabric(tmp_path, monkeypatch, capsys):
+    script = tmp_path / "stub.py"
+    script.write_text(STUB)
+    monkeypatch.setattr(sys, "argv", ["multi_fabric.py", str(script), "--fabrics", "qic,atl", "--user", "admin", "--pass", "secret", "--chg", "CHG1", "--answers", "y", "n", "--full-rescan"])
+
+    with pytest.raises(SystemExit) as exit:
+        multi_fabric.main()
+
+    assert exit.value.code == 1
+    lines = capsys.readouterr().out.splitlines()
+    for site in ("qic", "atl"):
+        assert "[" + site + "] args --fabric " + site + " --user admin --chg CHG1 --full-rescan" in lines
+        assert "[" + site + "] password secret" in lines
+        assert "[" + site + "] answers y n" in lines
+    assert "[atl] ERROR! could not reach the fabric" in lines
+
+    #the password is only passed in the environment
+    assert not any("secret" in line for line in lines if "args" in line)
+
+    summary = lines[lines.index("Fabric  Result    Errors  Seconds") + 1:]
+    assert summary[0].split()[:3] == ["qic", "ok", "0"]
+    assert summary[1].split()[:3] == ["atl", "failed", "1"]
@@ -0,0 +1,115 @@
+import socket
+import time
+
+import pytest
+
+import resolver
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    resolver.cache.clear()
+    yield
+    resolver.cache.clear()
+
+
+class StubResolver:
+    '''
+    Local stand in for socket.gethostbyaddr. Known ips resolve to host-<last octet>, anything else raises socket.herror.
+    '''
+    def __init__(self, known, delay=0):
+        self.known = known
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, ip):
+        self.calls.append(ip)
+        time.sleep(self.delay)
+        if ip not in self.known:
+            raise socket.herror("unknown host")
+        return("host-" + ip.split(".")[-1], [], [ip])
+
+
+def test_duplicate_ips_are_looked_up_once():
+    stub = StubResolver(["10.0.0.1", "10.0.0.2"])
+
+    hostnames = resolver.resolve_all(["10.0.0.1", "10.0.0.2", "10.0.0.1", "10.0.0.1"], resolver=stub)
+
+    assert hostnames == {"10.0.0.1": "host-1", "10.0.0.2": "host-2"}
+    assert sorted(stub.calls) == ["10.0.0.1", "10.0.0.2"]
+
+
+def test_cached_ips_are_not_looked_up_again():
+    stub = StubResolver(["10.0.0.1"])
+
+    resolver.resolve_all(["10.0.0.1"], resolver=stub)
+    hostnames = resolver.resolve_all(["10.0.0.1"], resolver=stub)
+
+    assert hostnames == {"10.0.0.1": "host-1"}
+    assert stub.calls == ["10.0.0.1"]
+
+
+def test_failed_lookup_is_cached_for_negative_ttl(monkeypatch):
+    stub = StubResolver([])
+    now = time.time()
+    monkeypatch.setattr(resolver.time, "time", lambda: now)
+
+    assert resolver.resolve_all(["10.0.0.9"], resolver=stub) == {"10.0.0.9": None}
+    assert resolver.cache["10.0.0.9"] == [None, now + resolver.NEGATIVE_TTL]
+
+    #still cached just before the negative TTL runs out
+    monkeypatch.setattr(resolver.time, "time", lambda: now + resolver.NEGATIVE_TTL - 1)
+    resolver.resolve_all(["10.0.0.9"], resolver=stub)
+    assert stub.calls == ["10.0.0.9"]
+
+    #looked up again once it has expired
+    monkeypatch.setattr(resolver.time, "time", lambda: now + resolver.NEGATIVE_TTL + 1)
+    resolver.resolve_all(["10.0.0.9"], resolver=stub)
+    assert stub.calls == ["10.0.0.9", "10.0.0.9"]
+
+
+def test_successful_lookup_uses_positive_ttl(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(resolver.time, "time", lambda: now)
+
+    resolver.resolve_all(["10.0.0.1"], resolver=StubResolver(["10.0.0.1"]))
+
+    assert resolver.cache["10.0.0.1"] == ["host-1", now + resolver.POSITIVE_TTL]
+
+
+def test_hung_lookup_times_out():
+    stub = StubResolver(["10.0.0.1"], delay=2)
+
+    start = time.monotonic()
+    hostnames = resolver.resolve_all(["10.0.0.1"], resolver=stub, timeout=0.1)
+
+    assert hostnames == {"10.0.0.1": None}
+    assert time.monotonic() - start < 1
+
+
+def test_cache_is_bounded_lru(monkeypatch):
+    monkeypatch.setattr(resolver, "CACHE_SIZE", 2)
+
+    resolver.store("10.0.0.1", "a")
+    resolver.store("10.0.0.2", "b")
+    resolver.cached("10.0.0.1")
+    resolver.store("10.0.0.3", "c")
+
+    assert list(resolver.cache) == ["10.0.0.1", "10.0.0.3"]
+
+
+def test_save_and_load_merge_with_other_runs(tmp_path):
+    path = str(tmp_path / "dns_cache.json")
+
+    #another run saved 10.0.0.2 since this run loaded
+    resolver.store("10.0.0.2", "b")
+    resolver.save(path)
+    resolver.cache.clear()
+
+    resolver.store("10.0.0.1", "a")
+    resolver.save(path)
+    resolver.cache.clear()
+
+    resolver.load(path)
+    assert resolver.cached("10.0.0.1") == (True, "a")
+    assert resolver.cached("10.0.0.2") == (True, "b")
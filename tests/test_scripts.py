@@ -0,0 +1,119 @@
+import json
+
+import pytest
+
+from conftest import FakeResponse
+
+
+def bd(unicast_route="no", unk_mac="flood", arp_flood="yes", subnets=None):
+    item = {"fvBD": {"attributes": {"dn": "uni/tn-A/BD-B", "unicastRoute": unicast_route, "unkMacUcastAct": unk_mac, "arpFlood": arp_flood}}}
+    if subnets != None:
+        item["fvBD"]["children"] = [{"fvSubnet": {"attributes": {"ip": ip}}} for ip in subnets]
+    return(item)
+
+
+def test_target_state(load_script):
+    add_l2flood = load_script("add_l2flood")
+
+    #already compliant
+    assert add_l2flood.target_state(bd()) == ({}, [])
+
+    #proxy and no arp flooding
+    assert add_l2flood.target_state(bd(unk_mac="proxy", arp_flood="no")) == ({"unkMacUcastAct": "flood", "arpFlood": "true"}, [])
+
+    #routing on without subnets is turned off
+    assert add_l2flood.target_state(bd(unicast_route="yes")) == ({"unicastRoute": "false"}, [])
+
+    #subnets are removed when routing is off
+    assert add_l2flood.target_state(bd(subnets=["10.0.0.1/24"])) == ({}, ["10.0.0.1/24"])
+
+    #BDs with subnets and routing on are left alone
+    assert add_l2flood.target_state(bd(unicast_route="yes", unk_mac="proxy", subnets=["10.0.0.1/24"])) == ({}, [])
+
+
+@pytest.fixture
+def modify_ports(load_script):
+    return(load_script("modify_ports"))
+
+
+def test_coalesce(modify_ports):
+    ports = [("23", "PG1"), ("21", "PG1"), ("22", "PG1"), ("24", "PG2"), ("30", "PG2"), ("05", "PG1")]
+
+    assert modify_ports.coalesce(ports) == [["05", "05", "PG1"], ["21", "23", "PG1"], ["24", "24", "PG2"], ["30", "30", "PG2"]]
+
+
+def selector_response(blocks):
+    '''
+    infraHPortS objects for get_selector_blocks. blocks is {selector name: [(block name, from, to), ...]}
+    '''
+    imdata = []
+    for name, ranges in blocks.items():
+        dn = "uni/infra/accportprof-LEAF101_IntfProfile/hports-" + name + "-typ-range"
+        children = [{"infraPortBlk": {"attributes": {"dn": dn + "/portblk-" + block, "name": block, "fromPort": start, "toPort": end}}} for block, start, end in ranges]
+        imdata.append({"infraHPortS": {"attributes": {"dn": dn}, "children": children}})
+    return(FakeResponse({"totalCount": str(len(imdata)), "imdata": imdata}))
+
+
+def posted(client):
+    return([json.loads(data) for url, data in client.session.posts])
+
+
+def test_remove_selector_port_deletes_single_port_selector(modify_ports, client):
+    client.session.get_handler = lambda url: selector_response({"Port-05": [("block2", "5", "5")]})
+
+    modify_ports.remove_selector_port("LEAF101_IntfProfile", 5)
+
+    assert posted(client) == [{"infraHPortS": {"attributes": {"dn": "uni/infra/accportprof-LEAF101_IntfProfile/hports-Port-05-typ-range", "status": "deleted"}, "children": []}}]
+
+
+def test_remove_selector_port_splits_range(modify_ports, client):
+    client.session.get_handler = lambda url: selector_response({"Port-21-29": [("block2", "21", "29")]})
+
+    modify_ports.remove_selector_port("LEAF101_IntfProfile", 25)
+
+    dn = "uni/infra/accportprof-LEAF101_IntfProfile/hports-Port-21-29-typ-range"
+    assert posted(client) == [{"infraHPortS": {"attributes": {"dn": dn}, "children": [
+        {"infraPortBlk": {"attributes": {"dn": dn + "/portblk-block2", "toPort": "24"}, "children": []}},
+        {"infraPortBlk": {"attributes": {"dn": dn + "/portblk-block3", "name": "block3", "fromPort": "26", "toPort": "29", "status": "created"}, "children": []}},
+    ]}}]
+
+
+def test_remove_selector_port_shrinks_range_edge(modify_ports, client):
+    client.session.get_handler = lambda url: selector_response({"Port-21-29": [("block2", "21", "29")]})
+
+    modify_ports.remove_selector_port("LEAF101_IntfProfile", 21)
+
+    assert posted(client)[0]["infraHPortS"]["children"] == [{"infraPortBlk": {"attributes": {"dn": "uni/infra/accportprof-LEAF101_IntfProfile/hports-Port-21-29-typ-range/portblk-block2", "fromPort": "22"}, "children": []}}]
+
+
+def test_remove_selector_port_not_found(modify_ports, client, capsys):
+    client.session.get_handler = lambda url: selector_response({"Port-21-29": [("block2", "21", "29")]})
+
+    modify_ports.remove_selector_port("LEAF101_IntfProfile", 30)
+
+    assert client.session.posts == []
+    assert "No interface selector covers port 30" in capsys.readouterr().out
+
+
+def test_decom_check_keeps_other_interfaces_when_one_fails(modify_ports, client, monkeypatch, capsys):
+    #eth1/1 is a port-channel member and the port-channel lookup fails
+    def handler(url):
+        if "phys-[eth1/1]" not in url:
+            return(FakeResponse())
+        if "rsp-subtree-include" in url:
+            return(FakeResponse(status_code=500))
+        return(FakeResponse({"totalCount": "1", "imdata": [{"l1RtMbrIfs": {"attributes": {}}}]}))
+    client.session.get_handler = handler
+    dn = "uni/tn-A/ap-B/epg-C/rspathAtt-[topology/pod-1/paths-101/pathep-[eth1/2]]"
+    item = {"url": "", "payload": {"fvRsPathAtt": {"attributes": {"dn": dn, "status": "deleted"}}}, "epg": "uni/tn-A/ap-B/epg-C", "message": "removed eth1/2"}
+    removed = []
+    monkeypatch.setattr(modify_ports, "decom_access", lambda details: {"label": details["interface"] + " on node 101", "items": [item], "policy": removed.append, "details": dict(details)})
+    monkeypatch.setattr(modify_ports, "post_by_tenant", lambda items, workers=1: [True for item in items])
+    monkeypatch.setattr("builtins.input", lambda prompt: "y")
+
+    modify_ports.decom_check({"node": "101", "interface": ["eth1/1", "eth1/2"]})
+
+    out = capsys.readouterr().out
+    assert "Skipped (could not be checked, will not be changed): eth1/1" in out
+    assert "removed eth1/2" in out
+    assert [details["interface"] for details in removed] == ["eth1/2"]
@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import FakeResponse
+
+
+def job(dn, state):
+    return({"configJob": {"attributes": {"dn": dn, "operSt": state, "details": ""}}})
+
+
+@pytest.fixture
+def snapshot(load_script, monkeypatch):
+    module = load_script("snapshot")
+
+    #fake clock so the backoff and timeout run without waiting
+    clock = [0.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    return(module)
+
+
+def test_wait_for_job_sees_the_new_job_with_the_get_cache_on(snapshot, client):
+    old = job("uni/backupst/jobs-[uni/fabric/configexp-defaultOneTime]/run-1", "success")
+    polls = [[old], [old], [old, job("uni/backupst/jobs-[uni/fabric/configexp-defaultOneTime]/run-2", "running")],
+             [old, job("uni/backupst/jobs-[uni/fabric/configexp-defaultOneTime]/run-2", "success")]]
+    client.GET_CACHE = True
+    client.session.get_handler = lambda url: FakeResponse({"totalCount": "1", "imdata": polls.pop(0)})
+
+    before = snapshot.get_jobs(client.fabric)
+    #a stale cached job list would never show run-2 and time out
+    result = snapshot.wait_for_job(client.fabric, before)
+
+    assert result["dn"].endswith("run-2")
+    assert len(client.session.gets) == 4
+
+
+def test_wait_for_job_exits_on_failed_job(snapshot, client):
+    client.session.get_handler = lambda url: FakeResponse({"totalCount": "1", "imdata": [job("run-2", "failed")]})
+
+    with pytest.raises(SystemExit):
+        snapshot.wait_for_job(client.fabric, {})
+
+
+def test_wait_for_job_exits_on_timeout(snapshot, client):
+    client.session.get_handler = lambda url: FakeResponse({"totalCount": "0", "imdata": []})
+
+    with pytest.raises(SystemExit):
+        snapshot.wait_for_job(client.fabric, {}, timeout=0)